@@ -0,0 +1,110 @@
+# app/core/cache.py
+
+import functools
+import logging
+from typing import Optional
+
+import orjson
+from starlette.responses import Response
+
+from .config import get_settings
+
+try:
+    import redis.asyncio as redis
+    from redis.exceptions import RedisError, WatchError
+except ImportError:  # redis là phụ thuộc tuỳ chọn, không có thì chạy không cache
+    redis = None
+    RedisError = OSError
+    WatchError = RedisError
+
+logger = logging.getLogger(__name__)
+
+redis_client: Optional["redis.Redis"] = None
+
+
+async def init_cache():
+    """Tạo client Redis khi khởi động nếu có cấu hình REDIS_URL"""
+    global redis_client
+    settings = get_settings()
+    if not settings.REDIS_URL:
+        return
+    if redis is None:
+        logger.warning("REDIS_URL được cấu hình nhưng chưa cài package redis, bỏ qua cache")
+        return
+    redis_client = redis.from_url(settings.REDIS_URL)
+
+
+async def close_cache():
+    global redis_client
+    if redis_client is not None:
+        await redis_client.aclose()
+        redis_client = None
+
+
+async def invalidate(namespace: str):
+    """Tăng version của namespace, các key cũ tự hết hạn theo TTL"""
+    if redis_client is None:
+        return
+    try:
+        await redis_client.incr(f"{namespace}:ver")
+    except RedisError as e:
+        logger.warning("Không invalidate được cache %s: %s", namespace, e)
+
+
+async def cache_get(key: str) -> Optional[bytes]:
+    """Đọc một giá trị thô; không có Redis hoặc Redis lỗi thì coi như miss"""
+    if redis_client is None:
+        return None
+    try:
+        return await redis_client.get(key)
+    except RedisError as e:
+        logger.warning("Đọc cache %s thất bại: %s", key, e)
+        return None
+
+
+async def cache_set(key: str, value: bytes, ttl: int):
+    if redis_client is None:
+        return
+    try:
+        await redis_client.set(key, value, ex=ttl)
+    except RedisError as e:
+        logger.warning("Ghi cache %s thất bại: %s", key, e)
+
+
+def _dumps(result) -> bytes:
+    # orjson tự serialize datetime/UUID, không cần qua jsonable_encoder
+    if hasattr(result, "model_dump"):
+        result = result.model_dump()
+    return orjson.dumps(result)
+
+
+def cached(key: str, ttl: int = 60, namespace: str = "grades"):
+    """Cache-aside cho handler: key được format từ tham số của handler, vd "all:{skip}:{limit}"."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if redis_client is None:
+                return await func(*args, **kwargs)
+
+            try:
+                version = int(await redis_client.get(f"{namespace}:ver") or 0)
+                cache_key = f"{namespace}:v{version}:{key.format(**kwargs)}"
+                hit = await redis_client.get(cache_key)
+            except RedisError as e:
+                logger.warning("Đọc cache thất bại, truy vấn DB: %s", e)
+                return await func(*args, **kwargs)
+
+            if hit is not None:
+                # Trả thẳng bytes đã serialize, bỏ qua validate/serialize lại
+                return Response(content=hit, media_type="application/json")
+
+            result = await func(*args, **kwargs)
+            try:
+                await redis_client.set(cache_key, _dumps(result), ex=ttl)
+            except RedisError as e:
+                logger.warning("Ghi cache thất bại: %s", e)
+            return result
+
+        return wrapper
+
+    return decorator
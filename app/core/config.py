@@ -1,13 +1,22 @@
 # app/core/config.py
 
 from functools import lru_cache
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     DATABASE_URL: str = "sqlite:///./students.db"
+    ASYNC_DATABASE_URL: Optional[str] = None  # None: suy ra từ DATABASE_URL (sqlite+aiosqlite)
     API_V1_STR: str = "/api/v1"
     PROJECT_NAME: str = "Student API"
-    GROQ_API_KEY: str = os.getenv("GROQ_API_KEY", "")
+    DEBUG: bool = False
+    DB_READ_POOL_SIZE: Optional[int] = None  # None: bằng số CPU
+    DB_MAX_OVERFLOW: int = 40
+    DB_POOL_RECYCLE: int = 3600
+    DB_POOL_WARN_RATIO: float = 0.8  # cảnh báo khi số connection đang mượn vượt tỉ lệ này của capacity
+    REDIS_URL: Optional[str] = None  # None: tắt cache
+    GROQ_API_KEY: str = ""
+    EMBEDDING_ONNX_PATH: Optional[str] = None  # thư mục model ONNX int8; None: dùng PyTorch
 
     class Config:
         env_file = ".env"
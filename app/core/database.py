@@ -1,12 +1,133 @@
 # app/core/database.py
 
+import asyncio
+import logging
+import os
+from typing import AsyncIterator, Iterator
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from .config import get_settings
+from .pool_health import PoolHealthMonitor
+
+logger = logging.getLogger(__name__)
 
 settings = get_settings()
 DATABASE_URL = settings.DATABASE_URL
+READ_POOL_SIZE = settings.DB_READ_POOL_SIZE or os.cpu_count() or 4
+
+
+def _is_file_sqlite(url: str) -> bool:
+    return url.startswith("sqlite") and ":memory:" not in url
+
+
+def _read_only_url(url: str) -> str:
+    # sqlite:///./students.db -> sqlite:///file:./students.db?mode=ro&uri=true
+    prefix, path = url.split(":///", 1)
+    separator = "&" if "?" in path else "?"
+    return f"{prefix}:///file:{path}{separator}mode=ro&uri=true"
+
+
+def _async_url(url: str) -> str:
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+    # sqlite:///./students.db -> sqlite+aiosqlite:///./students.db
+    return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+
+
+def _engine_options(url: str, pool_size: int, max_overflow: int, poolclass=QueuePool) -> dict:
+    options = {"echo": settings.DEBUG}
+    if url.startswith("sqlite") and not _is_file_sqlite(url):
+        # SQLite in-memory: giữ pool mặc định, mỗi connection là một DB riêng
+        return options
+
+    options.update(
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_pre_ping=True,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+    )
+    if url.startswith("sqlite"):
+        options["poolclass"] = poolclass
+        options["connect_args"] = {"check_same_thread": False, "timeout": 30}
+    return options
+
+
+def _set_sqlite_write_pragmas(dbapi_connection, connection_record):
+    # WAL cho phép đọc song song với ghi, synchronous=NORMAL tránh fsync mỗi commit
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.execute("PRAGMA cache_size=-20000")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+    # Tắt BEGIN tự động của driver để _begin_immediate tự mở transaction
+    dbapi_connection.isolation_level = None
+
+
+def _begin_immediate(connection):
+    # Giữ write lock ngay từ đầu transaction, tránh SQLITE_BUSY khi nâng cấp lock giữa chừng;
+    # tranh chấp ngắn được busy_timeout hấp thụ
+    connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def _set_sqlite_read_pragmas(dbapi_connection, connection_record):
+    # Connection read-only không đổi được journal_mode, chỉ chỉnh phần đọc
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.execute("PRAGMA cache_size=-20000")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
 
-engine = create_engine(DATABASE_URL, echo=True)
+if _is_file_sqlite(DATABASE_URL):
+    # SQLite chỉ cho một writer tại một thời điểm: writer dùng đúng một connection,
+    # reader mở file ở chế độ read-only với pool theo số CPU
+    READ_ONLY_URL = _read_only_url(DATABASE_URL)
+
+    # Engine sync chỉ còn dùng cho create_all và các caller ngoài request
+    write_engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL, 1, 0))
+    async_write_engine = create_async_engine(
+        _async_url(DATABASE_URL),
+        **_engine_options(DATABASE_URL, 1, 0, AsyncAdaptedQueuePool),
+    )
+    async_read_engine = create_async_engine(
+        _async_url(READ_ONLY_URL),
+        **_engine_options(DATABASE_URL, READ_POOL_SIZE, settings.DB_MAX_OVERFLOW, AsyncAdaptedQueuePool),
+    )
+
+    for _engine in (write_engine, async_write_engine.sync_engine):
+        event.listen(_engine, "connect", _set_sqlite_write_pragmas)
+        event.listen(_engine, "begin", _begin_immediate)
+    event.listen(async_read_engine.sync_engine, "connect", _set_sqlite_read_pragmas)
+else:
+    write_engine = create_engine(
+        DATABASE_URL, **_engine_options(DATABASE_URL, READ_POOL_SIZE, settings.DB_MAX_OVERFLOW)
+    )
+    async_write_engine = create_async_engine(
+        _async_url(DATABASE_URL),
+        **_engine_options(DATABASE_URL, READ_POOL_SIZE, settings.DB_MAX_OVERFLOW),
+    )
+    async_read_engine = async_write_engine
+
+engine = write_engine
+
+pool_monitors = {"write": PoolHealthMonitor("write", async_write_engine.sync_engine, warn_ratio=settings.DB_POOL_WARN_RATIO)}
+if async_read_engine is not async_write_engine:
+    pool_monitors["read"] = PoolHealthMonitor(
+        "read", async_read_engine.sync_engine, warn_ratio=settings.DB_POOL_WARN_RATIO
+    )
+
+AsyncReadSession = async_sessionmaker(async_read_engine, class_=AsyncSession, expire_on_commit=False)
+AsyncWriteSession = async_sessionmaker(async_write_engine, class_=AsyncSession, expire_on_commit=False)
+
+if not settings.DEBUG:
+    logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING)
 
 
 def create_db_and_tables():
@@ -14,12 +135,64 @@ def create_db_and_tables():
     from app.models.student import Student
     from app.models.grade import Grade
 
-    SQLModel.metadata.create_all(engine)
+    SQLModel.metadata.create_all(write_engine)
+
+    # create_all bỏ qua bảng đã tồn tại nên không thêm index mới vào DB cũ; tạo bù các index còn thiếu
+    with write_engine.begin() as connection:
+        for table in SQLModel.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
+
+async def warm_up_pool():
+    """Mở sẵn song song các connection trong pool để request đầu tiên không phải chờ kết nối"""
+    async def _warm_one(async_engine):
+        async with async_engine.connect() as connection:
+            await connection.exec_driver_sql("SELECT 1")
+
+    engines = [async_write_engine]
+    if async_read_engine is not async_write_engine:
+        engines.append(async_read_engine)
+    await asyncio.gather(*[
+        _warm_one(async_engine)
+        for async_engine in engines
+        if isinstance(async_engine.pool, QueuePool)
+        for _ in range(async_engine.pool.size())
+    ])
+
+
+def log_pool_configuration():
+    """Ghi lại cấu hình pool khi khởi động để dễ nhận ra khi pool bị cạn"""
+    engines = {"write": async_write_engine}
+    if async_read_engine is not async_write_engine:
+        engines["read"] = async_read_engine
+    for name, async_engine in engines.items():
+        pool = async_engine.pool
+        if isinstance(pool, QueuePool):
+            logger.info(
+                "%s pool: pool_size=%d, max_overflow=%d, timeout=%ss",
+                name, pool.size(), pool._max_overflow, pool.timeout()
+            )
+        else:
+            logger.info("%s pool: %s", name, type(pool).__name__)
+
+
+async def dispose_async_engines():
+    await async_write_engine.dispose()
+    if async_read_engine is not async_write_engine:
+        await async_read_engine.dispose()
+
+
+def get_session() -> Iterator[Session]:
+    with Session(write_engine) as session:
+        yield session
+
 
+async def get_async_read_session() -> AsyncIterator[AsyncSession]:
+    async with AsyncReadSession() as session:
+        yield session
 
-def get_session():
-    def _get():
-        with Session(engine) as session:
-            yield session
 
-    return _get
\ No newline at end of file
+async def get_async_write_session() -> AsyncIterator[AsyncSession]:
+    async with AsyncWriteSession() as session:
+        yield session
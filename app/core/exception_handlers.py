@@ -1,24 +1,28 @@
 # app/core/exception_handlers.py
 
+import logging
+
 from fastapi import Request
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse
 from starlette.status import HTTP_422_UNPROCESSABLE_ENTITY, HTTP_500_INTERNAL_SERVER_ERROR
 
+from app.utils import error_response
+
+logger = logging.getLogger(__name__)
+
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
 
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=HTTP_422_UNPROCESSABLE_ENTITY,
-        content={
-            "success": False,
-            "error": "Validation Error",
-            "details": exc.errors()
-        },
+        content=error_response("Validation Error", jsonable_encoder(exc.errors())),
     )
 
 async def generic_exception_handler(request: Request, exc: Exception):
-
-    return JSONResponse(
+    # Router không tự bắt lỗi nữa, mọi lỗi chưa xử lý đều về đây nên ghi lại traceback
+    logger.error("Unhandled error on %s %s", request.method, request.url.path, exc_info=exc)
+    return ORJSONResponse(
         status_code=HTTP_500_INTERNAL_SERVER_ERROR,
         content={
             "success": False,
@@ -0,0 +1,18 @@
+# app/core/http_client.py
+
+import httpx
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Client dùng chung cho các API bên ngoài, giữ kết nối keep-alive giữa các request"""
+    try:
+        import h2  # noqa: F401  HTTP/2 cần package h2 (httpx[http2])
+        http2 = True
+    except ImportError:
+        http2 = False
+
+    return httpx.AsyncClient(
+        timeout=30.0,
+        http2=http2,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+    )
@@ -1,15 +1,20 @@
 # app/core/middleware.py
 
+import logging
 import time
 from fastapi import Request
 from starlette.responses import Response
 
+logger = logging.getLogger(__name__)
+
+
 class LogRequestMiddleware:
 
     async def __call__(self, request: Request, call_next):
-        start_time = time.time()
+        start_time = time.perf_counter_ns()
         response: Response = await call_next(request)
-        process_time = time.time() - start_time
+        process_time = (time.perf_counter_ns() - start_time) / 1e9
         response.headers["X-Process-Time"] = f"{process_time:.3f}s"
-        print(f"{request.method} {request.url.path} completed in {process_time:.3f}s")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s %s completed in %.3fms", request.method, request.url.path, process_time * 1e3)
         return response
@@ -0,0 +1,77 @@
+# app/core/pool_health.py
+
+import logging
+import time
+from collections import deque
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+
+def _percentile(sorted_values: list, percent: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(percent / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class PoolHealthMonitor:
+    """Theo dõi số connection đang được mượn và thời gian giữ connection của một pool"""
+
+    def __init__(self, name: str, engine: Engine, window: int = 1000, warn_ratio: float = 0.8):
+        self.name = name
+        self.engine = engine
+        self.hold_times_ms = deque(maxlen=window)  # ring buffer cho p50/p95
+        self.total_checkouts = 0
+        self.peak_checked_out = 0
+        self.warn_ratio = warn_ratio
+
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+
+    def _capacity(self):
+        pool = self.engine.pool
+        if not isinstance(pool, QueuePool):
+            return None
+        return pool.size() + max(pool._max_overflow, 0)
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["checkout_at"] = time.perf_counter_ns()
+        self.total_checkouts += 1
+
+        pool = self.engine.pool
+        if not isinstance(pool, QueuePool):
+            return
+        checked_out = pool.checkedout()
+        self.peak_checked_out = max(self.peak_checked_out, checked_out)
+
+        capacity = self._capacity()
+        if checked_out >= max(1, int(capacity * self.warn_ratio)) and capacity > 1:
+            logger.warning(
+                "%s pool gần cạn: %d/%d connection đang được sử dụng",
+                self.name, checked_out, capacity
+            )
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        started = connection_record.info.pop("checkout_at", None)
+        if started is not None:
+            self.hold_times_ms.append((time.perf_counter_ns() - started) / 1e6)
+
+    def snapshot(self) -> dict:
+        pool = self.engine.pool
+        hold_times = sorted(self.hold_times_ms)
+        return {
+            "status": pool.status(),
+            "capacity": self._capacity(),
+            "checked_out": pool.checkedout() if isinstance(pool, QueuePool) else None,
+            "peak_checked_out": self.peak_checked_out,
+            "total_checkouts": self.total_checkouts,
+            "hold_time_ms": {
+                "samples": len(hold_times),
+                "p50": round(_percentile(hold_times, 50), 3),
+                "p95": round(_percentile(hold_times, 95), 3),
+            },
+        }
@@ -1,11 +1,24 @@
+import os
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse
 
 from app.core.config import get_settings
-from app.core.database import create_db_and_tables
+from app.core.database import (
+    create_db_and_tables,
+    warm_up_pool,
+    log_pool_configuration,
+    dispose_async_engines,
+    pool_monitors
+)
+from app.core.cache import init_cache, close_cache
+from app.core.http_client import create_http_client
 from app.core.middleware import LogRequestMiddleware
+from app.utils import success_response
 from app.core.exception_handlers import (
     validation_exception_handler,
     generic_exception_handler
@@ -16,11 +29,27 @@ from app.routers.grade import router as grade_router
 
 settings = get_settings()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    create_db_and_tables()
+    await warm_up_pool()
+    log_pool_configuration()
+    await init_cache()
+    app.state.http_client = create_http_client()
+    yield
+    await app.state.http_client.aclose()
+    await close_cache()
+    await dispose_async_engines()
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version="1.0.0",
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     docs_url=f"{settings.API_V1_STR}/docs",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 app.add_middleware(
@@ -36,16 +65,29 @@ app.middleware("http")(LogRequestMiddleware())
 app.add_exception_handler(RequestValidationError, validation_exception_handler)
 app.add_exception_handler(Exception, generic_exception_handler)
 
-@app.on_event("startup")
-def on_startup():
-    create_db_and_tables()
-
 app.include_router(student_router, prefix=settings.API_V1_STR)
 app.include_router(grade_router, prefix=settings.API_V1_STR)  # Thêm grade router
 
+# Trả thẳng ORJSONResponse để orjson serialize dataclass, bỏ qua bước jsonable_encoder
 @app.get("/")
 def health_check():
-    return {"success": True, "data": None, "message": "API is up and running"}
+    return ORJSONResponse(success_response(message="API is up and running"))
+
+@app.get("/debug/pool")
+def pool_health():
+    data = {name: monitor.snapshot() for name, monitor in pool_monitors.items()}
+    return ORJSONResponse(success_response(data, "Connection pool health"))
 
 if __name__ == "__main__":
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    # Cần cài uvloop và httptools; khi phát triển có thể chạy `uvicorn app.main:app --reload`
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        access_log=False,
+        proxy_headers=False,
+        log_level="warning",
+        workers=os.cpu_count(),
+    )
\ No newline at end of file
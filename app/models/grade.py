@@ -2,17 +2,26 @@
 
 import uuid
 from datetime import datetime
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 from uuid import UUID
 
-from sqlalchemy import Column, DateTime, String, Float
+from sqlalchemy import Column, DateTime, String, Float, Index, func
 from sqlalchemy.dialects.sqlite import TEXT
 
-from sqlmodel import SQLModel, Field
+from sqlmodel import SQLModel, Field, Relationship
+
+if TYPE_CHECKING:
+    from app.models.student import Student
 
 
 class Grade(SQLModel, table=True):
     __tablename__ = "grades"
+    __table_args__ = (
+        # (student_id, subject) cũng phục vụ các truy vấn chỉ lọc theo student_id
+        Index("ix_grade_student_subject", "student_id", "subject"),
+        Index("ix_grade_subject_score", "subject", "score"),
+        Index("ix_grade_semester", "semester", "academic_year"),
+    )
 
     id: Optional[UUID] = Field(
         default=None,
@@ -38,11 +47,24 @@ class Grade(SQLModel, table=True):
     academic_year: str = Field(nullable=False, max_length=10, description="Academic year")
 
     created_at: datetime = Field(
-        sa_column=Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
+        sa_column=Column(
+            DateTime(timezone=True),
+            default=func.current_timestamp(),
+            server_default=func.current_timestamp(),
+            nullable=False
+        )
     )
     updated_at: datetime = Field(
-        sa_column=Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False, onupdate=datetime.utcnow)
+        sa_column=Column(
+            DateTime(timezone=True),
+            default=func.current_timestamp(),
+            server_default=func.current_timestamp(),
+            nullable=False,
+            onupdate=func.current_timestamp()
+        )
     )
 
+    student: Optional["Student"] = Relationship(back_populates="grades")
+
     def __repr__(self):
         return f"<Grade(student_id={self.student_id}, subject='{self.subject}', score={self.score})>"
\ No newline at end of file
@@ -1,14 +1,17 @@
 # app/models/student.py
 
 import uuid
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, List, Optional
 from uuid import UUID
 
-from sqlalchemy import Column, DateTime
+from sqlalchemy import Column, DateTime, func
 from sqlalchemy.dialects.sqlite import TEXT
 
-from sqlmodel import SQLModel, Field
+from sqlmodel import SQLModel, Field, Relationship
+
+if TYPE_CHECKING:
+    from app.models.grade import Grade
 
 
 class Student(SQLModel, table=True):
@@ -19,6 +22,8 @@ class Student(SQLModel, table=True):
         sa_column=Column(
             TEXT,
             primary_key=True,
+            # Giữ Python default: sinh id trong SQLite cần thêm DEFAULT cho cột id,
+            # mà create_all không sửa bảng đã có (DB tạo từ schema cũ) -> phải migrate
             default=lambda: str(uuid.uuid4()),
             unique=True,
             nullable=False
@@ -27,13 +32,31 @@ class Student(SQLModel, table=True):
 
     name: str = Field(nullable=False, max_length=100)
     email: str = Field(nullable=False, index=True, unique=True, max_length=100)
-    enrollment_date: datetime = Field(default_factory=datetime.utcnow)
+    # UTC naive: SQLite bỏ tzinfo nên giá trị có múi giờ sẽ đọc lại khác lúc ghi
+    enrollment_date: datetime = Field(default_factory=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
 
+    # default là biểu thức SQL: CURRENT_TIMESTAMP được ghi thẳng vào câu INSERT nên vẫn do SQLite
+    # tính, kể cả với bảng tạo từ schema cũ chưa có DEFAULT cho cột
     created_at: datetime = Field(
-        default_factory=datetime.utcnow,
-        sa_column=Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
+        sa_column=Column(
+            DateTime(timezone=True),
+            default=func.current_timestamp(),
+            server_default=func.current_timestamp(),
+            nullable=False
+        )
     )
     updated_at: datetime = Field(
-        default_factory=datetime.utcnow,
-        sa_column=Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False, onupdate=datetime.utcnow)
-    )
\ No newline at end of file
+        sa_column=Column(
+            DateTime(timezone=True),
+            default=func.current_timestamp(),
+            server_default=func.current_timestamp(),
+            nullable=False,
+            onupdate=func.current_timestamp()
+        )
+    )
+
+    # passive_deletes: để FK trong DB chặn việc xóa student còn điểm, không nạp grades chỉ để xóa
+    grades: List["Grade"] = Relationship(
+        back_populates="student",
+        sa_relationship_kwargs={"passive_deletes": True}
+    )
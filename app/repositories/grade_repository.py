@@ -1,7 +1,9 @@
-from sqlalchemy.orm import Session
 from sqlalchemy import and_, func
-from typing import List, Optional
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import AsyncIterator, List, Optional
 from app.models.grade import Grade
+from app.models.student import Student
 from app.schemas.grade import GradeCreate, GradeUpdate
 from .grade_repository_interface import GradeRepositoryInterface
 
@@ -9,122 +11,185 @@ from .grade_repository_interface import GradeRepositoryInterface
 class GradeRepository(GradeRepositoryInterface):
     """Implementation của Grade Repository"""
 
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
 
-    def create(self, grade_data: GradeCreate) -> Grade:
+    async def create(self, grade_data: GradeCreate) -> Grade:
         """Tạo điểm mới"""
         db_grade = Grade(**grade_data.dict())
         self.db.add(db_grade)
-        self.db.commit()
-        self.db.refresh(db_grade)
+        await self.db.commit()
+        await self.db.refresh(db_grade)
         return db_grade
 
-    def get_by_id(self, grade_id: int) -> Optional[Grade]:
+    async def get_by_id(self, grade_id: int) -> Optional[Grade]:
         """Lấy điểm theo ID"""
-        return self.db.query(Grade).filter(Grade.id == grade_id).first()
+        return (await self.db.exec(select(Grade).where(Grade.id == grade_id))).first()
 
-    def get_all(self, skip: int = 0, limit: int = 100) -> List[Grade]:
+    async def get_all(self, skip: int = 0, limit: int = 100) -> List[Grade]:
         """Lấy tất cả điểm với phân trang"""
-        return self.db.query(Grade).offset(skip).limit(limit).all()
+        return (await self.db.exec(select(Grade).offset(skip).limit(limit))).all()
 
-    def get_by_student_id(self, student_id: int) -> List[Grade]:
+    async def get_by_student_id(self, student_id: int) -> List[Grade]:
         """Lấy tất cả điểm của một học sinh"""
-        return self.db.query(Grade).filter(Grade.student_id == student_id).all()
+        return (await self.db.exec(select(Grade).where(Grade.student_id == student_id))).all()
 
-    def get_by_subject(self, subject: str) -> List[Grade]:
+    async def get_by_subject(self, subject: str) -> List[Grade]:
         """Lấy tất cả điểm theo môn học"""
-        return self.db.query(Grade).filter(Grade.subject == subject).all()
+        return (await self.db.exec(select(Grade).where(Grade.subject == subject))).all()
 
-    def get_by_semester(self, semester: str, academic_year: str) -> List[Grade]:
+    async def get_by_semester(self, semester: str, academic_year: str) -> List[Grade]:
         """Lấy tất cả điểm theo học kỳ và năm học"""
-        return self.db.query(Grade).filter(
+        return (await self.db.exec(select(Grade).where(
             and_(
                 Grade.semester == semester,
                 Grade.academic_year == academic_year
             )
-        ).all()
+        ))).all()
 
-    def get_by_student_and_subject(self, student_id: int, subject: str) -> List[Grade]:
+    async def get_by_student_and_subject(self, student_id: int, subject: str) -> List[Grade]:
         """Lấy điểm của học sinh theo môn học"""
-        return self.db.query(Grade).filter(
+        return (await self.db.exec(select(Grade).where(
             and_(
                 Grade.student_id == student_id,
                 Grade.subject == subject
             )
-        ).all()
+        ))).all()
 
-    def update(self, grade_id: int, grade_data: GradeUpdate) -> Optional[Grade]:
+    async def update(self, grade_id: int, grade_data: GradeUpdate) -> Optional[Grade]:
         """Cập nhật điểm"""
-        db_grade = self.db.query(Grade).filter(Grade.id == grade_id).first()
+        db_grade = await self.get_by_id(grade_id)
         if db_grade:
             update_data = grade_data.dict(exclude_unset=True)
             for field, value in update_data.items():
                 setattr(db_grade, field, value)
-            self.db.commit()
-            self.db.refresh(db_grade)
+            await self.db.commit()
+            await self.db.refresh(db_grade)
         return db_grade
 
-    def delete(self, grade_id: int) -> bool:
+    async def delete(self, grade_id: int) -> bool:
         """Xóa điểm"""
-        db_grade = self.db.query(Grade).filter(Grade.id == grade_id).first()
+        db_grade = await self.get_by_id(grade_id)
         if db_grade:
-            self.db.delete(db_grade)
-            self.db.commit()
+            await self.db.delete(db_grade)
+            await self.db.commit()
             return True
         return False
 
-    def exists(self, grade_id: int) -> bool:
+    async def exists(self, grade_id: int) -> bool:
         """Kiểm tra điểm có tồn tại không"""
-        return self.db.query(Grade).filter(Grade.id == grade_id).first() is not None
+        return await self.get_by_id(grade_id) is not None
 
-    def count_by_student(self, student_id: int) -> int:
+    async def count_by_student(self, student_id: int) -> int:
         """Đếm số điểm của một học sinh"""
-        return self.db.query(Grade).filter(Grade.student_id == student_id).count()
+        return (await self.db.exec(
+            select(func.count()).select_from(Grade).where(Grade.student_id == student_id)
+        )).one()
 
-    def get_average_by_student(self, student_id: int, subject: Optional[str] = None) -> float:
+    async def get_average_by_student(self, student_id: int, subject: Optional[str] = None) -> float:
         """Tính điểm trung bình của học sinh (có thể theo môn)"""
-        query = self.db.query(func.avg(Grade.score)).filter(Grade.student_id == student_id)
+        query = select(func.avg(Grade.score)).where(Grade.student_id == student_id)
 
         if subject:
-            query = query.filter(Grade.subject == subject)
+            query = query.where(Grade.subject == subject)
 
-        result = query.scalar()
+        result = (await self.db.exec(query)).one()
         return float(result) if result else 0.0
 
     # Thêm một số method bổ sung hữu ích
 
-    def get_by_student_and_semester(self, student_id: int, semester: str, academic_year: str) -> List[Grade]:
+    async def get_student_grade_report(self, student_id: str) -> Optional[dict]:
+        """Lấy điểm và điểm trung bình của học sinh trong cùng một truy vấn; None nếu không có học sinh"""
+        # LEFT JOIN từ students: học sinh chưa có điểm vẫn trả về một hàng (Grade là None)
+        rows = (await self.db.exec(
+            select(
+                Grade,
+                func.avg(Grade.score).over(partition_by=Student.id).label("average")
+            )
+            .select_from(Student)
+            .outerjoin(Grade, Grade.student_id == Student.id)
+            .where(Student.id == student_id)
+        )).all()
+        if not rows:
+            return None
+
+        grades = [grade for grade, _ in rows if grade is not None]
+        return {
+            "grades": grades,
+            "average": float(rows[0].average) if grades else 0.0
+        }
+
+    async def get_by_student_and_semester(self, student_id: int, semester: str, academic_year: str) -> List[Grade]:
         """Lấy điểm của học sinh theo học kỳ"""
-        return self.db.query(Grade).filter(
+        return (await self.db.exec(select(Grade).where(
             and_(
                 Grade.student_id == student_id,
                 Grade.semester == semester,
                 Grade.academic_year == academic_year
             )
-        ).all()
+        ))).all()
 
-    def get_highest_score_by_subject(self, subject: str) -> Optional[Grade]:
+    async def get_highest_score_by_subject(self, subject: str) -> Optional[Grade]:
         """Lấy điểm cao nhất của một môn học"""
-        return self.db.query(Grade).filter(Grade.subject == subject).order_by(Grade.score.desc()).first()
+        return (await self.db.exec(
+            select(Grade).where(Grade.subject == subject).order_by(Grade.score.desc())
+        )).first()
 
-    def get_lowest_score_by_subject(self, subject: str) -> Optional[Grade]:
+    async def get_lowest_score_by_subject(self, subject: str) -> Optional[Grade]:
         """Lấy điểm thấp nhất của một môn học"""
-        return self.db.query(Grade).filter(Grade.subject == subject).order_by(Grade.score.asc()).first()
+        return (await self.db.exec(
+            select(Grade).where(Grade.subject == subject).order_by(Grade.score.asc())
+        )).first()
 
-    def get_grades_above_score(self, min_score: float) -> List[Grade]:
+    async def get_grades_above_score(self, min_score: float) -> List[Grade]:
         """Lấy tất cả điểm trên một ngưỡng"""
-        return self.db.query(Grade).filter(Grade.score >= min_score).all()
+        return (await self.db.exec(select(Grade).where(Grade.score >= min_score))).all()
 
-    def get_grades_below_score(self, max_score: float) -> List[Grade]:
-        """Lấy tất cả điểm dưới một ngưỡng"""
-        return self.db.query(Grade).filter(Grade.score <= max_score).all()
+    async def stream(self, min_score: Optional[float] = None, batch_size: int = 200) -> AsyncIterator[Grade]:
+        """Duyệt điểm theo từng lô từ cursor thay vì nạp toàn bộ danh sách vào bộ nhớ"""
+        query = select(Grade)
+        if min_score is not None:
+            query = query.where(Grade.score >= min_score)
 
-    def get_subject_statistics(self, subject: str) -> dict:
-        """Thống kê điểm của một môn học"""
-        grades = self.db.query(Grade.score).filter(Grade.subject == subject).all()
+        result = await self.db.stream_scalars(query.execution_options(yield_per=batch_size))
+        async for grade in result:
+            yield grade
 
-        if not grades:
+    async def get_grades_below_score(self, max_score: float) -> List[Grade]:
+        """Lấy tất cả điểm dưới một ngưỡng"""
+        return (await self.db.exec(select(Grade).where(Grade.score <= max_score))).all()
+
+    async def get_statistics_by_subject(self) -> List[dict]:
+        """Thống kê điểm của tất cả các môn học"""
+        rows = (await self.db.exec(
+            select(
+                Grade.subject,
+                func.count().label("total_grades"),
+                func.round(func.avg(Grade.score), 2).label("average_score"),
+                func.min(Grade.score).label("min_score"),
+                func.max(Grade.score).label("max_score")
+            ).group_by(Grade.subject)
+        )).all()
+
+        # Làm tròn ngay trong SQL, index (subject, score) đủ để GROUP BY không cần đọc bảng
+        return [row._asdict() for row in rows]
+
+    async def get_score_rows(self) -> List[tuple]:
+        """Lấy (id, subject, score) của tất cả điểm, dùng để dựng lại thống kê"""
+        return (await self.db.exec(select(Grade.id, Grade.subject, Grade.score))).all()
+
+    async def get_subject_statistics(self, subject: str) -> dict:
+        """Thống kê điểm của một môn học"""
+        count, average, max_score, min_score = (await self.db.exec(
+            select(
+                func.count(Grade.id),
+                func.avg(Grade.score),
+                func.max(Grade.score),
+                func.min(Grade.score)
+            ).where(Grade.subject == subject)
+        )).one()
+
+        if not count:
             return {
                 "count": 0,
                 "average": 0.0,
@@ -132,11 +197,9 @@ class GradeRepository(GradeRepositoryInterface):
                 "min": 0.0
             }
 
-        scores = [grade.score for grade in grades]
-
         return {
-            "count": len(scores),
-            "average": sum(scores) / len(scores),
-            "max": max(scores),
-            "min": min(scores)
+            "count": count,
+            "average": average,
+            "max": max_score,
+            "min": min_score
         }
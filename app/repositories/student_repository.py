@@ -3,7 +3,10 @@
 from typing import Sequence, Optional
 from uuid import UUID
 
-from sqlmodel import Session, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import raiseload
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from fastapi import HTTPException, status
 
 from app.models.student import Student
@@ -11,44 +14,49 @@ from app.schemas.student import StudentCreate, StudentUpdate
 from app.repositories.student_repository_interface import IStudentRepository
 
 
+def _is_duplicate_email(error: IntegrityError) -> bool:
+    return "UNIQUE constraint failed: students.email" in str(error.orig)
+
+
 class StudentRepository(IStudentRepository):
     """
     Implementation của IStudentRepository, dùng SQLModel để thao tác CRUD trên bảng students.
     """
 
-    def __init__(self, session: Session):
+    def __init__(self, session: AsyncSession):
         self.session = session
 
-    def create(self, student_in: StudentCreate) -> Student:
-        # Kiểm tra email đã tồn tại chưa
-        existing = self.session.exec(
-            select(Student).where(Student.email == student_in.email)
-        ).first()
-        if existing:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Email đã tồn tại"
-            )
-
+    async def create(self, student_in: StudentCreate) -> Student:
         # Tạo object Student từ dữ liệu đã validate
         student_data = student_in.model_dump()
         obj = Student(**student_data)
 
         self.session.add(obj)
-        self.session.commit()
-        self.session.refresh(obj)
+        try:
+            await self.session.commit()
+        except IntegrityError as e:
+            await self.session.rollback()
+            # Unique index trên email đã kiểm tra trùng, không cần SELECT trước;
+            # các vi phạm ràng buộc khác không phải lỗi của client nên ném tiếp
+            if not _is_duplicate_email(e):
+                raise
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Email đã tồn tại"
+            )
+        await self.session.refresh(obj)
         return obj
 
-    def get_all(self, skip: int = 0, limit: int = 100) -> Sequence[Student]:
-        return self.session.exec(
-            select(Student).offset(skip).limit(limit)
-        ).all()
+    async def get_all(self, skip: int = 0, limit: int = 100) -> Sequence[Student]:
+        return (await self.session.exec(
+            select(Student).options(raiseload("*")).offset(skip).limit(limit)
+        )).all()
 
-    def get(self, student_id: UUID) -> Optional[Student]:
-        return self.session.get(Student, str(student_id))
+    async def get(self, student_id: UUID) -> Optional[Student]:
+        return await self.session.get(Student, str(student_id))
 
-    def update(self, student_id: UUID, student_in: StudentUpdate) -> Student:
-        db_obj = self.session.get(Student, str(student_id))
+    async def update(self, student_id: UUID, student_in: StudentUpdate) -> Student:
+        db_obj = await self.session.get(Student, str(student_id))
         if not db_obj:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -60,17 +68,27 @@ class StudentRepository(IStudentRepository):
             setattr(db_obj, key, value)
 
         self.session.add(db_obj)
-        self.session.commit()
-        self.session.refresh(db_obj)
+        await self.session.commit()
+        await self.session.refresh(db_obj)
         return db_obj
 
-    def delete(self, student_id: UUID) -> None:
-        db_obj = self.session.get(Student, str(student_id))
+    async def delete(self, student_id: UUID) -> None:
+        db_obj = await self.session.get(Student, str(student_id))
         if not db_obj:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Student không tồn tại"
             )
 
-        self.session.delete(db_obj)
-        self.session.commit()
\ No newline at end of file
+        await self.session.delete(db_obj)
+        try:
+            await self.session.commit()
+        except IntegrityError as e:
+            await self.session.rollback()
+            # foreign_keys=ON: SQLite chặn xóa student còn điểm thay vì để lại grades mồ côi
+            if "FOREIGN KEY constraint failed" not in str(e.orig):
+                raise
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Student vẫn còn điểm, cần xóa điểm trước"
+            )
\ No newline at end of file
@@ -12,26 +12,26 @@ class IStudentRepository(ABC):
 
 
     @abstractmethod
-    def create(self, student_in: StudentCreate) -> Student:
+    async def create(self, student_in: StudentCreate) -> Student:
 
         raise NotImplementedError
 
     @abstractmethod
-    def get_all(self, skip: int = 0, limit: int = 100) -> Sequence[Student]:
+    async def get_all(self, skip: int = 0, limit: int = 100) -> Sequence[Student]:
 
         raise NotImplementedError
 
     @abstractmethod
-    def get(self, student_id: UUID) -> Optional[Student]:
+    async def get(self, student_id: UUID) -> Optional[Student]:
 
         raise NotImplementedError
 
     @abstractmethod
-    def update(self, student_id: UUID, student_in: StudentUpdate) -> Student:
+    async def update(self, student_id: UUID, student_in: StudentUpdate) -> Student:
 
         raise NotImplementedError
 
     @abstractmethod
-    def delete(self, student_id: UUID) -> None:
+    async def delete(self, student_id: UUID) -> None:
 
         raise NotImplementedError
@@ -1,23 +1,68 @@
 # app/routers/chatbot.py
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from typing import Dict, Any, Optional, List
 
 from app.schemas.chatbot import ChatQuery, ChatResponse, ChatFeedback
-from app.services.ai_service import AIService
+from app.core.cache import cache_get
+from app.services.ai_service import AIService, VECTOR_STORE_NAMESPACE
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Dựng AIService (nạp/dựng vector store) đúng một lần lúc khởi động, sau lifespan của app nên đã có
+    # http_client; chạy trong worker thread để không chặn event loop.
+    # Đọc version của index trước khi dựng: worker khác refresh sau thời điểm này sẽ được nạp lại
+    version = await cache_get(f"{VECTOR_STORE_NAMESPACE}:ver")
+    app.state.ai_service = await asyncio.to_thread(
+        AIService, http_client=app.state.http_client, vector_store_version=version
+    )
+    yield
+
 
 router = APIRouter(
     prefix="/chatbot",
     tags=["chatbot"],
     responses={404: {"description": "Not found"}},
+    lifespan=lifespan,
 )
 
-# Singleton instance of AIService
-ai_service = AIService()
-
-
-def get_ai_service():
-    return ai_service
+_SUGGESTIONS = {
+    "grades": [
+        "Show me the top 5 students in Mathematics this semester",
+        "What's the average score in Computer Science?",
+        "Which student has improved the most in Physics between semesters?",
+        "Compare the grade distributions between Biology and Chemistry",
+        "Show me students with failing grades who need intervention"
+    ],
+    "students": [
+        "Who are the new students that enrolled this semester?",
+        "Show me students participating in AI RAG projects",
+        "Which students are excelling in multiple subjects?",
+        "Give me a profile of student with ID XYZ including all their grades",
+        "Find students who haven't submitted their projects yet"
+    ],
+    "courses": [
+        "Which courses have the highest pass rates?",
+        "Show me enrollment trends for Computer Science courses",
+        "Compare student performance in introductory vs advanced courses",
+        "Which course has the most even grade distribution?",
+        "What's the most challenging course based on average grades?"
+    ]
+}
+
+# Lấy 2 gợi ý mỗi nhóm, tối đa 5, khi không có context hợp lệ
+_DEFAULT_SUGGESTIONS = tuple(
+    suggestion for category in _SUGGESTIONS.values() for suggestion in category[:2]
+)[:5]
+
+def get_ai_service(request: Request) -> AIService:
+    return request.app.state.ai_service
 
 
 @router.post("/query", response_model=ChatResponse)
@@ -47,6 +92,30 @@ async def query_chatbot(
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
 
 
+@router.post("/chat/stream")
+async def stream_chatbot(
+        query: ChatQuery,
+        ai_service: AIService = Depends(get_ai_service)
+):
+    """
+    Process a natural language query and stream the answer as Server-Sent Events.
+    Each event carries {"content": "..."}; the stream ends with "data: [DONE]".
+    """
+    user_role = query.context.get("user_role") if query.context else None
+
+    async def events():
+        try:
+            async for chunk in ai_service.chat_stream(query.query, query.user_id, user_role=user_role):
+                yield f"data: {json.dumps({'content': chunk})}\n\n"
+        except Exception as e:
+            # Headers are already sent, so report the failure as an SSE error event
+            yield f"event: error\ndata: {json.dumps({'detail': f'Error processing query: {str(e)}'})}\n\n"
+            return
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
 @router.post("/feedback", response_model=Dict[str, Any])
 async def submit_feedback(feedback: ChatFeedback):
     """Submit feedback for a chatbot response to help improve the system"""
@@ -68,7 +137,7 @@ async def refresh_knowledge(
     Should be called after significant data updates.
     """
     try:
-        ai_service.refresh_vector_store()
+        await ai_service.refresh_vector_store()
         return {
             "success": True,
             "message": "Knowledge base refreshed successfully"
@@ -83,35 +152,4 @@ async def suggest_queries(
                                        description="Context for query suggestions (e.g., 'grades', 'students', 'courses')"),
 ):
     """Provides suggested natural language queries based on the given context"""
-    suggestions = {
-        "grades": [
-            "Show me the top 5 students in Mathematics this semester",
-            "What's the average score in Computer Science?",
-            "Which student has improved the most in Physics between semesters?",
-            "Compare the grade distributions between Biology and Chemistry",
-            "Show me students with failing grades who need intervention"
-        ],
-        "students": [
-            "Who are the new students that enrolled this semester?",
-            "Show me students participating in AI RAG projects",
-            "Which students are excelling in multiple subjects?",
-            "Give me a profile of student with ID XYZ including all their grades",
-            "Find students who haven't submitted their projects yet"
-        ],
-        "courses": [
-            "Which courses have the highest pass rates?",
-            "Show me enrollment trends for Computer Science courses",
-            "Compare student performance in introductory vs advanced courses",
-            "Which course has the most even grade distribution?",
-            "What's the most challenging course based on average grades?"
-        ]
-    }
-
-    if not context or context not in suggestions:
-        # Return a mix of suggestions if no valid context
-        all_suggestions = []
-        for category in suggestions.values():
-            all_suggestions.extend(category[:2])  # Take 2 from each category
-        return all_suggestions[:5]
-
-    return suggestions[context]
\ No newline at end of file
+    return _SUGGESTIONS.get(context, _DEFAULT_SUGGESTIONS)
@@ -1,11 +1,22 @@
 # app/routers/grade.py
 
-from typing import List
+from typing import List, Optional
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session, select
 
-from app.core.database import get_session
+from fastapi import APIRouter, Depends, HTTPException, status
+from pydantic import TypeAdapter
+from sqlalchemy import insert, update
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy.orm import joinedload, raiseload
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.cache import cached, invalidate
+from app.core.database import (
+    AsyncReadSession,
+    get_async_read_session,
+    get_async_write_session
+)
 from app.models.grade import Grade
 from app.models.student import Student
 from app.schemas.grade import (
@@ -16,275 +27,241 @@ from app.schemas.grade import (
     GradeResponseModel
 )
 from app.schemas.student import ResponseModel
+from app.repositories.grade_repository import GradeRepository
+from app.services import grade_stats
 
-router = APIRouter(prefix="/grades", tags=["grades"])
+router = APIRouter(prefix="/grades", tags=["grades"], default_response_class=ORJSONResponse)
+
+# Validate cả danh sách trong một lần gọi vào pydantic-core thay vì từng dòng
+_grade_read = TypeAdapter(GradeRead)
+_grade_list = TypeAdapter(List[GradeRead])
+_grade_with_student_list = TypeAdapter(List[GradeWithStudent])
 
 
 @router.post("/", response_model=ResponseModel)
-def create_grade(
+async def create_grade(
         grade_data: GradeCreate,
-        session: Session = Depends(get_session())
+        session: AsyncSession = Depends(get_async_write_session)
 ):
     """Create a new grade"""
-    try:
-        # Kiểm tra student tồn tại
-        student = session.get(Student, grade_data.student_id)
-        if not student:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Student not found"
-            )
-
-        # Tạo grade mới
-        grade = Grade(**grade_data.model_dump())
-        session.add(grade)
-        session.commit()
-        session.refresh(grade)
-
-        return ResponseModel(
-            success=True,
-            data=GradeRead.model_validate(grade),
-            message="Grade created successfully"
-        )
-    except Exception as e:
-        session.rollback()
+    # Kiểm tra student tồn tại
+    student = await session.get(Student, grade_data.student_id)
+    if not student:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=str(e)
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Student not found"
         )
 
+    # Tạo grade mới, RETURNING trả về luôn hàng vừa ghi (cả timestamp do DB sinh) thay cho refresh
+    grade = (await session.exec(
+        insert(Grade).values(**grade_data.model_dump()).returning(Grade)
+    )).scalar_one()
+    await session.commit()
+    await invalidate("grades")
+    await grade_stats.record_grade(grade.id, grade.subject, grade.score)
+
+    return ResponseModel(
+        success=True,
+        data=GradeRead.model_validate(grade),
+        message="Grade created successfully"
+    )
+
 
 @router.get("/", response_model=ResponseModel)
-def get_all_grades(
+@cached("all:{skip}:{limit}", ttl=60)
+async def get_all_grades(
         skip: int = 0,
         limit: int = 100,
-        session: Session = Depends(get_session())
+        session: AsyncSession = Depends(get_async_read_session)
 ):
     """Get all grades"""
-    try:
-        statement = select(Grade).offset(skip).limit(limit)
-        grades = session.exec(statement).all()
+    statement = select(Grade).options(raiseload("*")).offset(skip).limit(limit)
+    grades = (await session.exec(statement)).all()
 
-        grades_data = [GradeRead.model_validate(grade) for grade in grades]
+    grades_data = _grade_list.validate_python(grades)
+
+    return ResponseModel(
+        success=True,
+        data=grades_data,
+        message=f"Retrieved {len(grades_data)} grades"
+    )
 
-        return ResponseModel(
-            success=True,
-            data=grades_data,
-            message=f"Retrieved {len(grades_data)} grades"
-        )
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=str(e)
-        )
+
+async def _ndjson_grades(min_score: Optional[float]):
+    # Session mở trong generator vì response vẫn đang stream sau khi handler trả về
+    async with AsyncReadSession() as session:
+        async for grade in GradeRepository(session).stream(min_score):
+            # Validate rồi ghi JSON thẳng trong pydantic-core, không tạo dict trung gian
+            yield _grade_read.dump_json(_grade_read.validate_python(grade)) + b"\n"
+
+
+@router.get("/stream")
+async def stream_grades(min_score: Optional[float] = None):
+    """Stream grades as NDJSON, optionally only those with score >= min_score"""
+    return StreamingResponse(_ndjson_grades(min_score), media_type="application/x-ndjson")
 
 
 @router.get("/{grade_id}", response_model=ResponseModel)
-def get_grade(
+async def get_grade(
         grade_id: UUID,
-        session: Session = Depends(get_session())
+        session: AsyncSession = Depends(get_async_read_session)
 ):
     """Get a specific grade by ID"""
-    try:
-        grade = session.get(Grade, str(grade_id))
-        if not grade:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Grade not found"
-            )
-
-        return ResponseModel(
-            success=True,
-            data=GradeRead.model_validate(grade),
-            message="Grade retrieved successfully"
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
+    grade = await session.get(Grade, str(grade_id))
+    if not grade:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=str(e)
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Grade not found"
         )
 
+    return ResponseModel(
+        success=True,
+        data=GradeRead.model_validate(grade),
+        message="Grade retrieved successfully"
+    )
+
 
 @router.get("/student/{student_id}", response_model=ResponseModel)
-def get_grades_by_student(
+@cached("student:{student_id}", ttl=60)
+async def get_grades_by_student(
         student_id: str,
-        session: Session = Depends(get_session())
+        session: AsyncSession = Depends(get_async_read_session)
 ):
     """Get all grades for a specific student"""
-    try:
-        # Kiểm tra student tồn tại
-        student = session.get(Student, student_id)
-        if not student:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Student not found"
-            )
-
-        statement = select(Grade).where(Grade.student_id == student_id)
-        grades = session.exec(statement).all()
-
-        grades_data = [GradeRead.model_validate(grade) for grade in grades]
-
-        return ResponseModel(
-            success=True,
-            data=grades_data,
-            message=f"Retrieved {len(grades_data)} grades for student"
+    # Kiểm tra student tồn tại
+    student = await session.get(Student, student_id)
+    if not student:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Student not found"
         )
-    except HTTPException:
-        raise
-    except Exception as e:
+
+    statement = select(Grade).where(Grade.student_id == student_id)
+    grades = (await session.exec(statement)).all()
+
+    grades_data = _grade_list.validate_python(grades)
+
+    return ResponseModel(
+        success=True,
+        data=grades_data,
+        message=f"Retrieved {len(grades_data)} grades for student"
+    )
+
+
+@router.get("/student/{student_id}/report", response_model=ResponseModel)
+async def get_student_grade_report(
+        student_id: str,
+        session: AsyncSession = Depends(get_async_read_session)
+):
+    """Get all grades for a student together with their average score"""
+    report = await GradeRepository(session).get_student_grade_report(student_id)
+    if report is None:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=str(e)
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Student not found"
         )
 
+    return ResponseModel(
+        success=True,
+        data={
+            "grades": _grade_list.validate_python(report["grades"]),
+            "average_score": round(report["average"], 2)
+        },
+        message=f"Retrieved {len(report['grades'])} grades for student"
+    )
+
 
 @router.get("/with-student/", response_model=ResponseModel)
-def get_grades_with_student_info(
+async def get_grades_with_student_info(
         skip: int = 0,
         limit: int = 100,
-        session: Session = Depends(get_session())
+        session: AsyncSession = Depends(get_async_read_session)
 ):
     """Get all grades with student information"""
-    try:
-        statement = (
-            select(Grade, Student)
-            .join(Student, Grade.student_id == Student.id)
-            .offset(skip)
-            .limit(limit)
-        )
-        results = session.exec(statement).all()
-
-        grades_with_student = []
-        for grade, student in results:
-            grade_data = GradeRead.model_validate(grade).model_dump()
-            grade_data["student_name"] = student.name
-            grade_data["student_email"] = student.email
-            grades_with_student.append(GradeWithStudent(**grade_data))
-
-        return ResponseModel(
-            success=True,
-            data=grades_with_student,
-            message=f"Retrieved {len(grades_with_student)} grades with student info"
-        )
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=str(e)
-        )
+    statement = (
+        select(Grade)
+        .options(joinedload(Grade.student, innerjoin=True))
+        .offset(skip)
+        .limit(limit)
+    )
+    grades = (await session.exec(statement)).all()
+
+    grades_with_student = _grade_with_student_list.validate_python(grades)
+
+    return ResponseModel(
+        success=True,
+        data=grades_with_student,
+        message=f"Retrieved {len(grades_with_student)} grades with student info"
+    )
 
 
 @router.put("/{grade_id}", response_model=ResponseModel)
-def update_grade(
+async def update_grade(
         grade_id: UUID,
         grade_update: GradeUpdate,
-        session: Session = Depends(get_session())
+        session: AsyncSession = Depends(get_async_write_session)
 ):
     """Update a specific grade"""
-    try:
-        grade = session.get(Grade, str(grade_id))
-        if not grade:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Grade not found"
-            )
-
-        # Cập nhật chỉ các field được cung cấp
-        update_data = grade_update.model_dump(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(grade, field, value)
-
-        session.add(grade)
-        session.commit()
-        session.refresh(grade)
-
-        return ResponseModel(
-            success=True,
-            data=GradeRead.model_validate(grade),
-            message="Grade updated successfully"
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        session.rollback()
+    grade = await session.get(Grade, str(grade_id))
+    if not grade:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=str(e)
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Grade not found"
         )
 
+    old_subject, old_score = grade.subject, grade.score
+
+    # Cập nhật chỉ các field được cung cấp; RETURNING nạp lại giá trị mới (cả updated_at) vào grade
+    update_data = grade_update.model_dump(exclude_unset=True)
+    if update_data:
+        grade = (await session.exec(
+            update(Grade).where(Grade.id == grade.id).values(**update_data).returning(Grade)
+        )).scalar_one()
+        await session.commit()
+        await invalidate("grades")
+    await grade_stats.replace_grade(grade.id, old_subject, old_score, grade.subject, grade.score)
+
+    return ResponseModel(
+        success=True,
+        data=GradeRead.model_validate(grade),
+        message="Grade updated successfully"
+    )
+
 
 @router.delete("/{grade_id}", response_model=ResponseModel)
-def delete_grade(
+async def delete_grade(
         grade_id: UUID,
-        session: Session = Depends(get_session())
+        session: AsyncSession = Depends(get_async_write_session)
 ):
     """Delete a specific grade"""
-    try:
-        grade = session.get(Grade, str(grade_id))
-        if not grade:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Grade not found"
-            )
-
-        session.delete(grade)
-        session.commit()
-
-        return ResponseModel(
-            success=True,
-            data=None,
-            message="Grade deleted successfully"
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        session.rollback()
+    grade = await session.get(Grade, str(grade_id))
+    if not grade:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=str(e)
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Grade not found"
         )
 
+    await session.delete(grade)
+    await session.commit()
+    await invalidate("grades")
+    await grade_stats.remove_grade(grade.id, grade.subject, grade.score)
+
+    return ResponseModel(
+        success=True,
+        data=None,
+        message="Grade deleted successfully"
+    )
+
 
 @router.get("/statistics/by-subject", response_model=ResponseModel)
-def get_statistics_by_subject(
-        session: Session = Depends(get_session())
+async def get_statistics_by_subject(
+        session: AsyncSession = Depends(get_async_read_session)
 ):
     """Get grade statistics by subject"""
-    try:
-        from sqlalchemy import func
-
-        statement = (
-            select(
-                Grade.subject,
-                func.count(Grade.id).label("total_grades"),
-                func.avg(Grade.score).label("average_score"),
-                func.min(Grade.score).label("min_score"),
-                func.max(Grade.score).label("max_score")
-            )
-            .group_by(Grade.subject)
-        )
+    statistics = await grade_stats.get_statistics_by_subject(GradeRepository(session))
 
-        results = session.exec(statement).all()
-
-        statistics = []
-        for row in results:
-            statistics.append({
-                "subject": row.subject,
-                "total_grades": row.total_grades,
-                "average_score": round(row.average_score, 2) if row.average_score else 0,
-                "min_score": row.min_score,
-                "max_score": row.max_score
-            })
-
-        return ResponseModel(
-            success=True,
-            data=statistics,
-            message="Statistics retrieved successfully"
-        )
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=str(e)
-        )
\ No newline at end of file
+    return ResponseModel(
+        success=True,
+        data=statistics,
+        message="Statistics retrieved successfully"
+    )
@@ -4,16 +4,22 @@ from typing import List
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlmodel import Session
+from fastapi.responses import ORJSONResponse
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.schemas.student import StudentCreate, StudentRead, StudentUpdate, ResponseModel
 from app.repositories.student_repository import StudentRepository
-from app.core.database import get_session
+from app.core.cache import invalidate
+from app.core.database import get_async_read_session, get_async_write_session
 
-router = APIRouter(prefix="/students", tags=["students"])
+router = APIRouter(prefix="/students", tags=["students"], default_response_class=ORJSONResponse)
 
 
-def get_student_repo(session: Session = Depends(get_session())) -> StudentRepository:
+async def get_student_repo(session: AsyncSession = Depends(get_async_write_session)) -> StudentRepository:
+    return StudentRepository(session)
+
+
+async def get_student_read_repo(session: AsyncSession = Depends(get_async_read_session)) -> StudentRepository:
     return StudentRepository(session)
 
 
@@ -23,11 +29,11 @@ def get_student_repo(session: Session = Depends(get_session())) -> StudentReposi
     status_code=status.HTTP_201_CREATED,
     summary="Create a new Student",
 )
-def create_student(
+async def create_student(
     student_in: StudentCreate,
     repo: StudentRepository = Depends(get_student_repo),
 ):
-    student = repo.create(student_in)
+    student = await repo.create(student_in)
     return ResponseModel(success=True, data=student, message="Student created successfully")
 
 
@@ -36,12 +42,12 @@ def create_student(
     response_model=ResponseModel,
     summary="Retrieve list of Students (with pagination)",
 )
-def read_students(
+async def read_students(
     skip: int = Query(0, ge=0, description="Number of records to skip"),
     limit: int = Query(100, gt=0, le=100, description="Number of records to return"),
-    repo: StudentRepository = Depends(get_student_repo),
+    repo: StudentRepository = Depends(get_student_read_repo),
 ):
-    students = repo.get_all(skip=skip, limit=limit)
+    students = await repo.get_all(skip=skip, limit=limit)
     return ResponseModel(success=True, data=students, message=None)
 
 
@@ -50,11 +56,11 @@ def read_students(
     response_model=ResponseModel,
     summary="Retrieve a Student by ID (UUID)",
 )
-def read_student(
+async def read_student(
     student_id: UUID,
-    repo: StudentRepository = Depends(get_student_repo),
+    repo: StudentRepository = Depends(get_student_read_repo),
 ):
-    student = repo.get(student_id)
+    student = await repo.get(student_id)
     if not student:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Student not found")
     return ResponseModel(success=True, data=student, message=None)
@@ -65,12 +71,12 @@ def read_student(
     response_model=ResponseModel,
     summary="Update a Student by ID (UUID)",
 )
-def update_student(
+async def update_student(
     student_id: UUID,
     student_in: StudentUpdate,
     repo: StudentRepository = Depends(get_student_repo),
 ):
-    updated = repo.update(student_id, student_in)
+    updated = await repo.update(student_id, student_in)
     return ResponseModel(success=True, data=updated, message="Update successful")
 
 
@@ -80,9 +86,11 @@ def update_student(
     status_code=status.HTTP_200_OK,
     summary="Delete a Student by ID (UUID)",
 )
-def delete_student(
+async def delete_student(
     student_id: UUID,
     repo: StudentRepository = Depends(get_student_repo),
 ):
-    repo.delete(student_id)
+    await repo.delete(student_id)
+    # /grades/student/{id} được cache theo namespace grades: bỏ đi để trả 404 ngay sau khi xóa
+    await invalidate("grades")
     return ResponseModel(success=True, data=None, message="Deletion successful")
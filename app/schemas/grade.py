@@ -5,7 +5,7 @@ from typing import Optional, Any
 from uuid import UUID
 from datetime import datetime
 
-from pydantic import constr, validator, Field
+from pydantic import AliasPath, constr, validator, Field
 from sqlmodel import SQLModel
 
 
@@ -112,8 +112,9 @@ class GradeRead(SQLModel):
 
 
 class GradeWithStudent(GradeRead):
-    student_name: str
-    student_email: str
+    # Đọc thẳng từ grade.student khi validate từ ORM, serialize ra student_name/student_email
+    student_name: str = Field(validation_alias=AliasPath("student", "name"))
+    student_email: str = Field(validation_alias=AliasPath("student", "email"))
 
     model_config = {
         "from_attributes": True
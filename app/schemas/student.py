@@ -2,12 +2,24 @@
 
 from typing import Optional, Any
 from uuid import UUID
-from datetime import datetime
+from datetime import datetime, timezone
 
-from pydantic import EmailStr, constr, validator
+from pydantic import EmailStr, NaiveDatetime, constr, validator
 from sqlmodel import SQLModel, Field
 
 
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _to_naive_utc(v: Optional[datetime]) -> Optional[datetime]:
+    # Cột enrollment_date trên SQLite không lưu tzinfo: quy về UTC naive để giá trị trả về
+    # khi tạo khớp với giá trị đọc lại sau này
+    if v is not None and v.tzinfo is not None:
+        return v.astimezone(timezone.utc).replace(tzinfo=None)
+    return v
+
+
 class StudentBase(SQLModel):
     name: constr(min_length=1, max_length=100) = Field(
         ..., description="Student full name"
@@ -16,10 +28,14 @@ class StudentBase(SQLModel):
         ..., description="Student email, must be valid and unique"
     )
     enrollment_date: Optional[datetime] = Field(
-        default_factory=datetime.utcnow,
-        description="Enrollment date (timestamp). Defaults to current time if not provided."
+        default_factory=_utcnow,
+        description="Enrollment date (UTC timestamp). Defaults to current time if not provided."
     )
 
+    @validator("enrollment_date")
+    def enrollment_date_to_utc(cls, v: Optional[datetime]):
+        return _to_naive_utc(v)
+
     @validator("name")
     def name_must_not_be_blank(cls, v: str):
         if not v.strip():
@@ -42,6 +58,10 @@ class StudentUpdate(SQLModel):
         None, description="Enrollment date (for update)"
     )
 
+    @validator("enrollment_date")
+    def enrollment_date_to_utc(cls, v: Optional[datetime]):
+        return _to_naive_utc(v)
+
     @validator("name")
     def name_must_not_be_blank(cls, v: Optional[str]):
         if v is not None and not v.strip():
@@ -53,7 +73,7 @@ class StudentRead(SQLModel):
     id: UUID
     name: str
     email: EmailStr
-    enrollment_date: datetime
+    enrollment_date: NaiveDatetime
     created_at: datetime
     updated_at: datetime
 
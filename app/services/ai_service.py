@@ -1,47 +1,148 @@
 # app/services/ai_service.py
 
+import asyncio
 import os
-from typing import Dict, List, Any, Optional
+import shutil
+from typing import AsyncIterator, Dict, List, Any, Optional
 import httpx
 import json
+import uuid
+from hashlib import blake2b
 from datetime import datetime
 
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
-from langchain.embeddings import HuggingFaceEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.chains import RetrievalQA
+from langchain_core.documents import Document
 from langchain_core.prompts import PromptTemplate
 
-from app.core.config import settings
+from app.core.cache import cache_get, cache_set, invalidate
+from app.core.config import get_settings
+from app.core.http_client import create_http_client
 from app.services.data_service import DataService
+from app.services.embeddings import EMBEDDING_MODEL, create_embeddings
 from app.services.prompt_engineering import PromptTemplates, RAGPromptOptimizer
 
 
+GROQ_MODEL = "llama3-70b-8192"  # Or another Groq model
+
+# Completions and query vectors are cached by content hash; bump the version when the model changes
+COMPLETION_CACHE_TTL = 3600
+EMBEDDING_CACHE_TTL = 24 * 3600
+EMBEDDING_CACHE_PREFIX = "emb:v1:"
+
+# Built indexes are saved under a hash of the source data so worker restarts skip re-embedding;
+# a refresh bumps the Redis version so the other workers reload
+VECTOR_STORE_CACHE_DIR = "./faiss_cache"
+VECTOR_STORE_NAMESPACE = "vector_store"
+
+# IVF-PQ needs ~39 training points per centroid and 256 per PQ codebook; below this use SQ8
+IVFPQ_MIN_VECTORS = 10_000
+IVFPQ_SUBQUANTIZERS = 48
+IVFPQ_NPROBE = 16
+
+
 class AIService:
     """Service for AI-related functionality including the chatbot and RAG system"""
 
-    def __init__(self):
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None,
+                 vector_store_version: Optional[bytes] = None):
         self.data_service = DataService()
+        self.http_client = http_client or create_http_client()
         self.vector_store = None
-        self.embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+        self.embeddings = create_embeddings()
         self.last_update_time = None
+        # Redis version observed before the index was built; None means the key did not exist yet
+        self.vector_store_version = vector_store_version
         self.initialize_vector_store()
 
     def initialize_vector_store(self):
-        """Initialize the vector store with data from the database"""
+        """Initialize the vector store with data from the database, reusing the on-disk index if the data is unchanged"""
         # Get data for embedding
         students_data = self.data_service.get_all_students_with_grades()
         courses_data = self.data_service.get_courses_data()
 
-        # Process and split the data
-        documents = self._process_data_to_documents(students_data, courses_data)
+        cache_dir = os.path.join(VECTOR_STORE_CACHE_DIR, self._data_hash(students_data, courses_data))
+        if os.path.isdir(cache_dir):
+            self.vector_store = FAISS.load_local(cache_dir, self.embeddings, allow_dangerous_deserialization=True)
+            document_count = len(self.vector_store.index_to_docstore_id)
+        else:
+            # Process and split the data
+            documents = self._process_data_to_documents(students_data, courses_data)
+
+            # Embed all chunks in one batched call, then build the index from the precomputed vectors
+            texts = [doc["page_content"] for doc in documents]
+            metadatas = [doc["metadata"] for doc in documents]
+            vectors = self.embeddings.embed_documents(texts)
+
+            # Create vector store
+            self.vector_store = self._build_vector_store(texts, metadatas, vectors)
+            self._save_vector_store(cache_dir)
+            document_count = len(documents)
 
-        # Create vector store
-        self.vector_store = FAISS.from_documents(documents, self.embeddings)
         self.last_update_time = datetime.now()
 
         # Save vector store info for analytics
-        self._save_vector_store_stats(len(documents))
+        self._save_vector_store_stats(document_count)
+
+    def _data_hash(self, students_data: List[Dict[str, Any]], courses_data: List[Dict[str, Any]]) -> str:
+        """Hash the source data together with the embedding backend that produced the vectors"""
+        payload = json.dumps(
+            [EMBEDDING_MODEL, type(self.embeddings).__name__, students_data, courses_data],
+            sort_keys=True, default=str
+        )
+        return blake2b(payload.encode(), digest_size=16).hexdigest()
+
+    def _save_vector_store(self, cache_dir: str):
+        """Write to a temporary directory and rename it, so concurrent workers never load a partial index"""
+        tmp_dir = f"{cache_dir}.{os.getpid()}.tmp"
+        self.vector_store.save_local(tmp_dir)
+        try:
+            os.replace(tmp_dir, cache_dir)
+        except OSError:
+            # Another worker saved the same data first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+
+        # Indexes for older data are never loaded again
+        for name in os.listdir(VECTOR_STORE_CACHE_DIR):
+            path = os.path.join(VECTOR_STORE_CACHE_DIR, name)
+            if path != cache_dir and not name.endswith(".tmp"):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _build_quantized_index(self, matrix: np.ndarray) -> faiss.Index:
+        """Train an int8 scalar-quantized index, or IVF-PQ once the corpus is large enough"""
+        count, dimensions = matrix.shape
+        if count >= IVFPQ_MIN_VECTORS:
+            quantizer = faiss.IndexFlatL2(dimensions)
+            index = faiss.IndexIVFPQ(quantizer, dimensions, min(4096, count // 39), IVFPQ_SUBQUANTIZERS, 8)
+            index.nprobe = IVFPQ_NPROBE
+        else:
+            index = faiss.IndexScalarQuantizer(dimensions, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+        index.train(matrix)
+        index.add(matrix)
+        return index
+
+    def _build_vector_store(self, texts: List[str], metadatas: List[Dict[str, Any]],
+                            vectors: List[List[float]]) -> FAISS:
+        """Wrap a quantized FAISS index in the LangChain vector store interface"""
+        matrix = np.asarray(vectors, dtype="float32")
+        index = self._build_quantized_index(matrix)
+
+        doc_ids = [str(uuid.uuid4()) for _ in texts]
+        docstore = InMemoryDocstore({
+            doc_id: Document(page_content=text, metadata=metadata)
+            for doc_id, text, metadata in zip(doc_ids, texts, metadatas)
+        })
+        return FAISS(
+            embedding_function=self.embeddings,
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id=dict(enumerate(doc_ids))
+        )
 
     def _process_data_to_documents(self, students_data: List[Dict[str, Any]],
                                    courses_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -56,33 +157,41 @@ class AIService:
         # Process student data
         for item in students_data:
             # Create rich text representation of each student with their grades
-            text = f"Student: {item['name']} (Email: {item['email']})\n"
-            text += f"ID: {item['id']}\n"
-            text += f"Enrollment Date: {item['enrollment_date']}\n"
-
-            if 'grades' in item and item['grades']:
-                text += "Grades:\n"
-                for grade in item['grades']:
-                    text += f"- {grade['subject']}: {grade['score']} ({grade['semester']})\n"
+            lines = [
+                f"Student: {item['name']} (Email: {item['email']})",
+                f"ID: {item['id']}",
+                f"Enrollment Date: {item['enrollment_date']}",
+            ]
+
+            grades = item.get('grades')
+            if grades:
+                lines.append("Grades:")
+                # One pass for the grade lines and the total/best/worst metrics
+                total = 0.0
+                best = worst = grades[0]
+                for grade in grades:
+                    score = grade['score']
+                    lines.append(f"- {grade['subject']}: {score} ({grade['semester']})")
+                    total += score
+                    if score > best['score']:
+                        best = grade
+                    if score < worst['score']:
+                        worst = grade
 
                 # Add calculated metrics
-                if len(item['grades']) > 0:
-                    avg_score = sum(g['score'] for g in item['grades']) / len(item['grades'])
-                    text += f"Average Score: {avg_score:.2f}\n"
-
-                    # Best and worst subjects
-                    best_subject = max(item['grades'], key=lambda g: g['score'])
-                    worst_subject = min(item['grades'], key=lambda g: g['score'])
-                    text += f"Best Subject: {best_subject['subject']} ({best_subject['score']})\n"
-                    text += f"Needs Improvement: {worst_subject['subject']} ({worst_subject['score']})\n"
+                lines.append(f"Average Score: {total / len(grades):.2f}")
+                lines.append(f"Best Subject: {best['subject']} ({best['score']})")
+                lines.append(f"Needs Improvement: {worst['subject']} ({worst['score']})")
 
             # Add any project or contribution info if available
             if item.get('ai_rag_project'):
-                text += f"AI RAG Project: {item['ai_rag_project']}\n"
+                lines.append(f"AI RAG Project: {item['ai_rag_project']}")
             if item.get('project_contributions'):
-                text += f"Project Contributions: {item['project_contributions']}\n"
+                lines.append(f"Project Contributions: {item['project_contributions']}")
             if item.get('learning_results'):
-                text += f"Learning Results: {item['learning_results']}\n"
+                lines.append(f"Learning Results: {item['learning_results']}")
+
+            text = "\n".join(lines) + "\n"
 
             # Split into chunks and add to documents
             chunks = text_splitter.split_text(text)
@@ -100,15 +209,20 @@ class AIService:
 
         # Process course data
         for course in courses_data:
-            text = f"Course: {course['name']} (ID: {course['id']})\n"
-            text += f"Department: {course['department']}\n"
-            text += f"Description: {course['description']}\n"
+            lines = [
+                f"Course: {course['name']} (ID: {course['id']})",
+                f"Department: {course['department']}",
+                f"Description: {course['description']}",
+            ]
 
             if 'statistics' in course:
-                text += "Course Statistics:\n"
-                text += f"- Average Score: {course['statistics']['avg_score']:.2f}\n"
-                text += f"- Number of Students: {course['statistics']['student_count']}\n"
-                text += f"- Pass Rate: {course['statistics']['pass_rate'] * 100:.1f}%\n"
+                statistics = course['statistics']
+                lines.append("Course Statistics:")
+                lines.append(f"- Average Score: {statistics['avg_score']:.2f}")
+                lines.append(f"- Number of Students: {statistics['student_count']}")
+                lines.append(f"- Pass Rate: {statistics['pass_rate'] * 100:.1f}%")
+
+            text = "\n".join(lines) + "\n"
 
             chunks = text_splitter.split_text(text)
             for i, chunk in enumerate(chunks):
@@ -129,7 +243,7 @@ class AIService:
         """Save statistics about the vector store for monitoring"""
         stats = {
             "document_count": document_count,
-            "embedding_model": "sentence-transformers/all-MiniLM-L6-v2",
+            "embedding_model": EMBEDDING_MODEL,
             "last_updated": self.last_update_time.isoformat(),
             "vector_dimensions": 384  # Dimensions for the selected model
         }
@@ -138,9 +252,45 @@ class AIService:
         # For now, just print
         print(f"Vector store stats: {json.dumps(stats, indent=2)}")
 
+    async def _embed_query(self, query: str) -> List[float]:
+        """Embed a query, reusing the FP16-packed vector cached in Redis when available"""
+        key = EMBEDDING_CACHE_PREFIX + blake2b(query.encode(), digest_size=16).hexdigest()
+        cached_vector = await cache_get(key)
+        if cached_vector is not None:
+            return np.frombuffer(cached_vector, dtype=np.float16).astype(np.float32).tolist()
+
+        vector = await asyncio.to_thread(self.embeddings.embed_query, query)
+        await cache_set(key, np.asarray(vector, dtype=np.float16).tobytes(), EMBEDDING_CACHE_TTL)
+        return vector
+
+    async def _retrieve(self, query: str, k: int = 8) -> list:
+        """Embed the query and search the index off the event loop"""
+        query_vector = await self._embed_query(query)
+        return await asyncio.to_thread(self.vector_store.similarity_search_by_vector, query_vector, k)
+
     async def query_groq(self, prompt: str, system_message: str = None) -> str:
-        """Query the Groq API for a response with enhanced error handling and logging"""
-        groq_api_key = settings.GROQ_API_KEY
+        """Query the Groq API for the full response, collected from the stream"""
+        return "".join([chunk async for chunk in self.stream_groq(prompt, system_message)])
+
+    async def stream_groq(self, prompt: str, system_message: str = None) -> AsyncIterator[str]:
+        """Yield response chunks as Groq generates them, serving repeated prompts from the Redis cache"""
+        cache_key = "groq:" + blake2b(
+            "\0".join((GROQ_MODEL, system_message or "", prompt)).encode(), digest_size=16
+        ).hexdigest()
+        cached_answer = await cache_get(cache_key)
+        if cached_answer is not None:
+            yield cached_answer.decode()
+            return
+
+        chunks = []
+        async for chunk in self._stream_groq_request(prompt, system_message):
+            chunks.append(chunk)
+            yield chunk
+        await cache_set(cache_key, "".join(chunks).encode(), COMPLETION_CACHE_TTL)
+
+    async def _stream_groq_request(self, prompt: str, system_message: str = None) -> AsyncIterator[str]:
+        """Stream a completion from the Groq API with enhanced error handling and logging"""
+        groq_api_key = get_settings().GROQ_API_KEY
         if not groq_api_key:
             raise ValueError("GROQ_API_KEY is not set in environment variables")
 
@@ -158,22 +308,31 @@ class AIService:
         messages.append({"role": "user", "content": prompt})
 
         data = {
-            "model": "llama3-70b-8192",  # Or another Groq model
+            "model": GROQ_MODEL,
             "messages": messages,
             "temperature": 0.5,
-            "max_tokens": 1000
+            "max_tokens": 1000,
+            "stream": True
         }
 
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(url, headers=headers, json=data)
+            async with self.http_client.stream("POST", url, headers=headers, json=data) as response:
                 if response.status_code != 200:
+                    await response.aread()
                     error_detail = response.json() if response.headers.get(
                         "content-type") == "application/json" else response.text
                     raise Exception(f"Error from Groq API ({response.status_code}): {error_detail}")
 
-                result = response.json()
-                return result["choices"][0]["message"]["content"]
+                # Server-sent events: one "data: {...}" line per delta, terminated by "data: [DONE]"
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    payload = line[len("data: "):]
+                    if payload == "[DONE]":
+                        break
+                    content = json.loads(payload)["choices"][0]["delta"].get("content")
+                    if content:
+                        yield content
         except httpx.TimeoutException:
             raise Exception("Request to Groq API timed out. The service might be experiencing high demand.")
         except Exception as e:
@@ -181,14 +340,30 @@ class AIService:
             print(f"Error in Groq API call: {str(e)}")
             raise
 
-    async def chat(self, query: str, user_id: Optional[str] = None, user_role: Optional[str] = None) -> Dict[str, Any]:
-        """Process a natural language query using RAG and return a response with enhanced context processing"""
-        # 1. Classify query type for prompt optimization
+    async def _sync_vector_store(self):
+        """Reload the index from disk when another worker has refreshed it"""
+        version = await cache_get(f"{VECTOR_STORE_NAMESPACE}:ver")
+        if version != self.vector_store_version:
+            await asyncio.to_thread(self.initialize_vector_store)
+            self.vector_store_version = version
+
+    async def _prepare_prompt(self, query: str, user_role: Optional[str] = None) -> Dict[str, Any]:
+        """Retrieve context for the query and build the system message and RAG prompt"""
+        await self._sync_vector_store()
+
+        # 1. Start retrieval in the background; embedding and search run in worker threads
+        retrieval = asyncio.create_task(self._retrieve(query))  # Get more docs for filtering
+
+        # 2. Meanwhile classify the query and build the system prompt, neither depends on retrieval
         query_type = PromptTemplates._classify_query_type(query)
+        system_message = PromptTemplates.get_system_message(user_role)
 
-        # 2. Retrieve relevant documents based on the query
-        retriever = self.vector_store.as_retriever(search_kwargs={"k": 8})  # Get more docs for filtering
-        raw_docs = retriever.get_relevant_documents(query)
+        # Add few-shot examples if available
+        few_shot_examples = PromptTemplates.generate_few_shot_examples(query_type)
+        if few_shot_examples:
+            system_message += "\n\nHere's an example of how to answer this type of question:\n" + few_shot_examples
+
+        raw_docs = await retrieval
 
         # 3. Convert to dict format for optimization
         docs_dict = [
@@ -204,25 +379,39 @@ class AIService:
         # 5. Prioritize and format context based on query type
         context = RAGPromptOptimizer.prioritize_context(optimized_docs, query_type)
 
-        # 6. Build advanced prompts
-        system_message = PromptTemplates.get_system_message(user_role)
-
-        # Add few-shot examples if available
-        few_shot_examples = PromptTemplates.generate_few_shot_examples(query_type)
-        if few_shot_examples:
-            system_message += "\n\nHere's an example of how to answer this type of question:\n" + few_shot_examples
-
-        # Create metadata for prompt
+        # 6. Create metadata for the main prompt
         metadata = {
             "recent_updates": self.last_update_time.strftime("%Y-%m-%d %H:%M:%S"),
             "query_type": query_type
         }
 
-        # Generate the main prompt with context
-        prompt = PromptTemplates.format_rag_prompt(query, context, metadata)
+        # Generate the main prompt with context, reusing the query type classified above
+        prompt = PromptTemplates.format_rag_prompt(query, context, metadata, query_type=query_type)
+
+        return {
+            "prompt": prompt,
+            "system_message": system_message,
+            "query_type": query_type,
+            "optimized_docs": optimized_docs,
+            "context": context
+        }
+
+    async def chat_stream(self, query: str, user_id: Optional[str] = None,
+                          user_role: Optional[str] = None) -> AsyncIterator[str]:
+        """Process a query using RAG and yield the answer as the LLM generates it"""
+        prepared = await self._prepare_prompt(query, user_role)
+        async for chunk in self.stream_groq(prepared["prompt"], prepared["system_message"]):
+            yield chunk
+
+    async def chat(self, query: str, user_id: Optional[str] = None, user_role: Optional[str] = None) -> Dict[str, Any]:
+        """Process a natural language query using RAG and return a response with enhanced context processing"""
+        prepared = await self._prepare_prompt(query, user_role)
+        query_type = prepared["query_type"]
+        optimized_docs = prepared["optimized_docs"]
+        context = prepared["context"]
 
         # 7. Get response from LLM (Groq)
-        response_text = await self.query_groq(prompt, system_message)
+        response_text = await self.query_groq(prepared["prompt"], prepared["system_message"])
 
         # 8. Prepare and return the final response with enhanced metadata
         sources = []
@@ -268,6 +457,8 @@ class AIService:
             "confidence": 0.85  # Would be calculated in production
         }
 
-    def refresh_vector_store(self):
-        """Refresh the vector store with the latest data"""
-        self.initialize_vector_store()
\ No newline at end of file
+    async def refresh_vector_store(self):
+        """Reload the vector store from the latest data (re-embedding only if it changed) and tell the other workers"""
+        await asyncio.to_thread(self.initialize_vector_store)
+        await invalidate(VECTOR_STORE_NAMESPACE)
+        self.vector_store_version = await cache_get(f"{VECTOR_STORE_NAMESPACE}:ver")
\ No newline at end of file
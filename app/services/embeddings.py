@@ -0,0 +1,93 @@
+# app/services/embeddings.py
+
+import logging
+from typing import List
+
+import numpy as np
+from langchain.embeddings import HuggingFaceEmbeddings
+from langchain_core.embeddings import Embeddings
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_BATCH_SIZE = 64
+EMBEDDING_MAX_LENGTH = 256  # max_seq_length của all-MiniLM-L6-v2
+ONNX_QUANTIZED_FILE = "model_quantized.onnx"  # tên file mặc định của ORTQuantizer
+
+
+class OnnxEmbeddings(Embeddings):
+    """MiniLM export sang ONNX và lượng tử hoá int8, pooling giống sentence-transformers.
+
+    Tạo model một lần (ngoài tiến trình app):
+        optimum-cli export onnx --model sentence-transformers/all-MiniLM-L6-v2 <dir>
+        optimum-cli onnxruntime quantize --onnx_model <dir> --avx512_vnni -o <dir>
+    """
+
+    def __init__(self, model_path: str, batch_size: int = EMBEDDING_BATCH_SIZE):
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(model_path, file_name=ONNX_QUANTIZED_FILE)
+        self.batch_size = batch_size
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        batches = []
+        for start in range(0, len(texts), self.batch_size):
+            inputs = self.tokenizer(
+                texts[start:start + self.batch_size],
+                padding=True,
+                truncation=True,
+                max_length=EMBEDDING_MAX_LENGTH,
+                return_tensors="np",
+            )
+            hidden = self.model(**inputs).last_hidden_state
+            # Mean pooling theo attention mask rồi chuẩn hoá L2
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            batches.append(pooled / np.linalg.norm(pooled, axis=1, keepdims=True))
+        if not batches:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.vstack(batches).astype(np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
+
+
+def _cuda_available() -> bool:
+    try:
+        import torch
+    except ImportError:
+        return False
+    return torch.cuda.is_available()
+
+
+def create_embeddings() -> Embeddings:
+    """GPU: sentence-transformers FP16; CPU: ONNX int8 nếu có EMBEDDING_ONNX_PATH, không thì PyTorch FP32"""
+    encode_kwargs = {"batch_size": EMBEDDING_BATCH_SIZE, "normalize_embeddings": True}
+
+    if _cuda_available():
+        import torch
+        return HuggingFaceEmbeddings(
+            model_name=EMBEDDING_MODEL,
+            model_kwargs={"device": "cuda", "model_kwargs": {"torch_dtype": torch.float16}},
+            encode_kwargs=encode_kwargs,
+        )
+
+    onnx_path = get_settings().EMBEDDING_ONNX_PATH
+    if onnx_path:
+        try:
+            return OnnxEmbeddings(onnx_path)
+        except ImportError:
+            logger.warning("EMBEDDING_ONNX_PATH được cấu hình nhưng chưa cài optimum[onnxruntime], dùng PyTorch")
+
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL,
+        model_kwargs={"device": "cpu"},
+        encode_kwargs=encode_kwargs,
+    )
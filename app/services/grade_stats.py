@@ -0,0 +1,159 @@
+# app/services/grade_stats.py
+
+import logging
+from typing import List, Optional
+
+from app.core import cache
+from app.core.cache import RedisError, WatchError
+from app.repositories.grade_repository import GradeRepository
+
+logger = logging.getLogger(__name__)
+
+STATS_PREFIX = "grade:stats:"    # Hash {total, sum} theo môn
+SCORES_PREFIX = "grade:scores:"  # Sorted set grade_id -> score theo môn, dùng cho min/max
+READY_KEY = "grade:stats_ready"  # Có key này thì các hash/sorted set đã khớp với DB
+READY_TTL = 3600                 # Định kỳ dựng lại để tự sửa sai lệch
+GEN_KEY = "grade:stats_gen"      # Tăng sau mỗi lần ghi; _rebuild WATCH key này
+
+# Cộng/trừ theo sorted set: chỉ đổi total/sum khi ZADD thật sự thêm id hoặc id thật sự bị xóa,
+# nên hook chạy sau một lần rebuild đã có sẵn điểm đó không bị cộng hai lần.
+# KEYS: từng cặp (stats, scores) theo thay đổi rồi GEN_KEY; ARGV: từng bộ (grade_id, score, sign)
+_APPLY_SCRIPT = """
+for i = 1, #ARGV, 3 do
+    local stats_key = KEYS[(i - 1) / 3 * 2 + 1]
+    local scores_key = KEYS[(i - 1) / 3 * 2 + 2]
+    local grade_id = ARGV[i]
+    if ARGV[i + 2] == "1" then
+        local score = tonumber(ARGV[i + 1])
+        if redis.call("ZADD", scores_key, score, grade_id) == 1 then
+            redis.call("HINCRBY", stats_key, "total", 1)
+            redis.call("HINCRBYFLOAT", stats_key, "sum", score)
+        end
+    else
+        local old_score = redis.call("ZSCORE", scores_key, grade_id)
+        if old_score then
+            redis.call("ZREM", scores_key, grade_id)
+            redis.call("HINCRBY", stats_key, "total", -1)
+            redis.call("HINCRBYFLOAT", stats_key, "sum", -tonumber(old_score))
+        end
+    end
+end
+redis.call("INCR", KEYS[#KEYS])
+"""
+
+
+def _add(pipe, grade_id: str, subject: str, score: float):
+    pipe.hincrby(STATS_PREFIX + subject, "total", 1)
+    pipe.hincrbyfloat(STATS_PREFIX + subject, "sum", score)
+    pipe.zadd(SCORES_PREFIX + subject, {grade_id: score})
+
+
+async def _update(changes: list):
+    if cache.redis_client is None:
+        return
+    keys, args = [], []
+    for grade_id, subject, score, sign in changes:
+        keys += [STATS_PREFIX + subject, SCORES_PREFIX + subject]
+        args += [grade_id, score, 1 if sign > 0 else -1]
+    keys.append(GEN_KEY)
+    try:
+        await cache.redis_client.eval(_APPLY_SCRIPT, len(keys), *keys, *args)
+    except RedisError as e:
+        logger.warning("Không cập nhật được thống kê điểm, sẽ dựng lại từ DB: %s", e)
+        try:
+            await cache.redis_client.delete(READY_KEY)
+        except RedisError:
+            pass
+
+
+async def record_grade(grade_id: str, subject: str, score: float):
+    """Cộng một điểm mới vào thống kê của môn"""
+    await _update([(str(grade_id), subject, score, 1)])
+
+
+async def remove_grade(grade_id: str, subject: str, score: float):
+    """Trừ một điểm đã xóa khỏi thống kê của môn"""
+    await _update([(str(grade_id), subject, score, -1)])
+
+
+async def replace_grade(grade_id: str, old_subject: str, old_score: float, subject: str, score: float):
+    """Thay điểm cũ bằng điểm mới (có thể đổi môn) trong cùng một transaction Redis"""
+    if (old_subject, old_score) == (subject, score):
+        return
+    await _update([
+        (str(grade_id), old_subject, old_score, -1),
+        (str(grade_id), subject, score, 1),
+    ])
+
+
+async def _rebuild(repo: GradeRepository) -> bool:
+    """Dựng lại thống kê từ DB; trả False nếu có lần ghi chen vào giữa (khi đó không đánh dấu ready)"""
+    client = cache.redis_client
+    async with client.pipeline(transaction=True) as pipe:
+        # Hook ghi chạy sau WATCH làm EXEC thất bại: một điểm commit sau khi đọc DB mà hook chạy
+        # trước EXEC sẽ bị xóa mất nếu vẫn ghi đè và đặt READY_KEY
+        await pipe.watch(GEN_KEY)
+        rows = await repo.get_score_rows()
+
+        stale = [key async for key in client.scan_iter(match=STATS_PREFIX + "*")]
+        stale += [key async for key in client.scan_iter(match=SCORES_PREFIX + "*")]
+
+        pipe.multi()
+        if stale:
+            pipe.delete(*stale)
+        for grade_id, subject, score in rows:
+            _add(pipe, str(grade_id), subject, score)
+        pipe.set(READY_KEY, 1, ex=READY_TTL)
+        try:
+            await pipe.execute()
+        except WatchError:
+            return False
+    return True
+
+
+async def _read_statistics() -> Optional[List[dict]]:
+    """Đọc thống kê đã dựng; None nếu dữ liệu trong Redis không nhất quán (vd. sorted set đã hết hạn)"""
+    client = cache.redis_client
+    stats_keys = sorted([key async for key in client.scan_iter(match=STATS_PREFIX + "*")])
+
+    pipe = client.pipeline(transaction=False)
+    for key in stats_keys:
+        subject = key.decode()[len(STATS_PREFIX):]
+        pipe.hgetall(key)
+        pipe.zrange(SCORES_PREFIX + subject, 0, 0, withscores=True)
+        pipe.zrange(SCORES_PREFIX + subject, -1, -1, withscores=True)
+    results = await pipe.execute()
+
+    statistics = []
+    for index, key in enumerate(stats_keys):
+        stats, lowest, highest = results[index * 3:index * 3 + 3]
+        total = int(stats.get(b"total", 0))
+        if total <= 0:
+            continue
+        if not lowest or not highest or b"sum" not in stats:
+            return None
+        statistics.append({
+            "subject": key.decode()[len(STATS_PREFIX):],
+            "total_grades": total,
+            "average_score": round(float(stats[b"sum"]) / total, 2),
+            "min_score": lowest[0][1],
+            "max_score": highest[0][1]
+        })
+    return statistics
+
+
+async def get_statistics_by_subject(repo: GradeRepository) -> List[dict]:
+    """Đọc thống kê theo môn từ Redis; chưa có hoặc sai lệch thì dựng lại từ DB, không được thì tính bằng SQL"""
+    if cache.redis_client is None:
+        return await repo.get_statistics_by_subject()
+    try:
+        statistics = None
+        if await cache.redis_client.exists(READY_KEY):
+            statistics = await _read_statistics()
+        if statistics is None and await _rebuild(repo):
+            statistics = await _read_statistics()
+        if statistics is not None:
+            return statistics
+    except RedisError as e:
+        logger.warning("Đọc thống kê từ Redis thất bại, tính bằng SQL: %s", e)
+    return await repo.get_statistics_by_subject()
@@ -1,15 +1,105 @@
 # app/services/prompt_engineering.py
-
-from typing import Dict, List, Any, Optional
-
-
-class PromptTemplates:
-    """Centralized class for managing all prompt templates with advanced engineering techniques"""
-
-    @staticmethod
-    def get_system_message(user_role: Optional[str] = None) -> str:
-        """Get the appropriate system message based on user role"""
-        base_message = """
+# Module chỉ dùng kiểu cụ thể để biên dịch được bằng mypyc (`mypyc app/services/prompt_engineering.py`);
+# không biên dịch thì vẫn chạy như Python thường
+
+import functools
+import heapq
+import re
+import threading
+from types import MappingProxyType
+from typing import Dict, FrozenSet, List, Any, Mapping, NamedTuple, Optional, Sequence
+
+try:
+    # unused-ignore: mypy --strict phải sạch cả khi có và khi không cài hyperscan
+    import hyperscan  # type: ignore[import-not-found, unused-ignore]
+except ImportError:  # hyperscan là phụ thuộc tuỳ chọn, chỉ dùng cho phân loại theo lô
+    hyperscan = None  # type: ignore[assignment, unused-ignore]
+
+# Từ khoá phân loại câu hỏi, dựng một lần lúc import; thứ tự kiểm tra giữ như cũ
+_WORD_RE = re.compile(r"\w+")
+_DIGIT_RE = re.compile(r"\d")
+# Gồm cả các dạng chia (số nhiều, -ed, -ing) mà phép so khớp chuỗi con cũ vẫn bắt được
+_COMPARISON_WORDS = frozenset({"compare", "compares", "compared", "comparing", "comparison", "comparisons",
+                               "difference", "differences", "versus", "vs", "against"})
+_RANKING_WORDS = frozenset({"top", "best", "highest", "lowest", "rank", "ranks", "ranking", "rankings", "ranked",
+                            "worst"})
+_ANALYTICS_WORDS = frozenset({"average", "averages", "averaged", "mean", "means", "median", "medians",
+                              "analyze", "analyzes", "analyzed", "analyzing", "analysis", "trend", "trends",
+                              "trending", "pattern", "patterns"})
+_IDENTIFICATION_WORDS = frozenset({"who", "student", "students", "name", "names", "named", "person"})
+_TEMPORAL_WORDS = frozenset({"when", "date", "dates", "dated", "time", "times", "timing", "schedule", "schedules",
+                             "scheduled", "scheduling"})
+
+# Thứ tự ưu tiên khi câu hỏi khớp nhiều loại
+_QUERY_CATEGORIES = (
+    ("comparison", _COMPARISON_WORDS),
+    ("ranking", _RANKING_WORDS),
+    ("analytics", _ANALYTICS_WORDS),
+    ("identification", _IDENTIFICATION_WORDS),
+    ("temporal", _TEMPORAL_WORDS),
+)
+
+# Câu hỏi dài hơn ngưỡng này hiếm khi lặp lại nên không đưa vào cache
+_CLASSIFY_CACHE_MAX_LEN = 512
+
+
+def _classify_query_type_impl(query: str) -> str:
+    # Tách từ một lần rồi giao với từng tập từ khoá; với câu hỏi ngắn cách này nhanh hơn
+    # chạy lần lượt từng regex, nhất là khi câu hỏi không khớp loại nào
+    tokens = set(_WORD_RE.findall(query.lower()))
+
+    # Classification logic
+    for name, words in _QUERY_CATEGORIES:
+        if tokens & words:
+            return name
+    return "general"
+
+
+_classify_query_type_cached = functools.lru_cache(maxsize=1024)(_classify_query_type_impl)
+
+
+def _build_hyperscan_db() -> Any:
+    # Mỗi loại là một regex alternation có biên từ, id là vị trí trong _QUERY_CATEGORIES;
+    # mọi pattern được khớp trong một lượt quét
+    expressions = [
+        (r"\b(?:" + "|".join(sorted(words)) + r")\b").encode() for _, words in _QUERY_CATEGORIES
+    ]
+    db = hyperscan.Database()
+    db.compile(
+        expressions=expressions,
+        ids=list(range(len(_QUERY_CATEGORIES))),
+        flags=hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SINGLEMATCH,
+    )
+    return db
+
+
+_hyperscan_db = _build_hyperscan_db() if hyperscan is not None else None
+# Scratch của database không dùng chung được giữa các thread cùng lúc
+_hyperscan_lock = threading.Lock()
+
+
+def _on_category_match(category_id: int, start: int, end: int, flags: int, best: List[int]) -> None:
+    # SINGLEMATCH: mỗi loại báo tối đa một lần, giữ loại có ưu tiên cao nhất
+    if category_id < best[0]:
+        best[0] = category_id
+
+
+def classify_query_types(queries: Sequence[str]) -> List[str]:
+    """Phân loại nhiều câu hỏi một lượt; dùng Hyperscan nếu có cài, không thì phân loại từng câu"""
+    if _hyperscan_db is None:
+        return [PromptTemplates._classify_query_type(query) for query in queries]
+
+    results = []
+    with _hyperscan_lock:
+        for query in queries:
+            best = [len(_QUERY_CATEGORIES)]
+            _hyperscan_db.scan(query.encode(), match_event_handler=_on_category_match, context=best)
+            results.append(_QUERY_CATEGORIES[best[0]][0] if best[0] < len(_QUERY_CATEGORIES) else "general")
+    return results
+
+
+# Chỉ có bốn system message khả dĩ: dựng sẵn lúc import để mọi request dùng chung đúng một chuỗi
+_BASE_SYSTEM_MESSAGE = """
         You are an academic assistant for a student management system. Your name is EduBot.
 
         Follow these guidelines:
@@ -22,73 +112,64 @@ class PromptTemplates:
         7. Do not make up or hallucinate information that isn't in the provided context
         """
 
-        if user_role == "teacher":
-            return base_message + """
+_SYSTEM_MESSAGES: Dict[Optional[str], str] = {
+    None: _BASE_SYSTEM_MESSAGE,
+    "teacher": _BASE_SYSTEM_MESSAGE + """
             Since you're assisting a teacher:
             - You can provide detailed academic analytics
             - Suggest interventions for struggling students
             - Offer comparative analysis across classes and subjects
             - Highlight exceptional performance and concerning patterns
-            """
-        elif user_role == "student":
-            return base_message + """
+            """,
+    "student": _BASE_SYSTEM_MESSAGE + """
             Since you're assisting a student:
             - Focus on their personal performance
             - Provide encouraging feedback
             - Suggest resources for improvement in weaker areas
             - Maintain a supportive and motivational tone
-            """
-        elif user_role == "admin":
-            return base_message + """
+            """,
+    "admin": _BASE_SYSTEM_MESSAGE + """
             Since you're assisting an administrator:
             - Provide high-level analytics across all students
             - Focus on system-wide patterns and trends
             - Highlight areas that may need policy intervention
             - Maintain a factual, data-driven approach
-            """
-        else:
-            return base_message
+            """,
+}
 
-    @staticmethod
-    def format_rag_prompt(query: str, context: str, metadata: Dict[str, Any] = None) -> str:
-        """
-        Create a RAG prompt with context inserted intelligently
-        """
-        # Extract query type to customize prompt
-        query_type = PromptTemplates._classify_query_type(query)
+# Khung prompt RAG: phần hướng dẫn tĩnh đứng trước, câu hỏi và context thay đổi theo request đứng cuối
+# để provider cache được tiền tố prompt giữa các request
+_RAG_INSTRUCTIONS = """
+        Based on the academic database information in the context below, please answer the question.
 
-        # Basic prompt with context
-        prompt = f"""
-        Based on the following academic database information, please answer this question:
+        Remember: Only use the information provided in the context. If you can't find the answer in the context, 
+        say "I don't have enough information in my current dataset to answer this question accurately."
+        """
 
+_RAG_QUESTION_TEMPLATE = """
         Question: {query}
 
         Context Information:
         {context}
-
-        Remember: Only use the information provided in the context. If you can't find the answer in the context, 
-        say "I don't have enough information in my current dataset to answer this question accurately."
         """
 
-        # Add specific instructions based on query type
-        if query_type == "comparison":
-            prompt += """
+_COMPARISON_SUFFIX = """
             When comparing students or subjects:
             1. Present a clear comparison using bullet points or tables
             2. Highlight key differences and similarities
             3. Avoid making judgments about which is "better" - just present facts
             4. Include specific metrics that are relevant for comparison
             """
-        elif query_type == "ranking":
-            prompt += """
+
+_RANKING_SUFFIX = """
             When providing rankings:
             1. Clearly state the criteria used for ranking
             2. Present a numbered list with scores where available
             3. Explain any ties or special considerations
             4. Note if the ranking is based on limited data
             """
-        elif query_type == "analytics":
-            prompt += """
+
+_ANALYTICS_SUFFIX = """
             When providing analytics:
             1. Include relevant statistical measures (average, median, range)
             2. Highlight any notable outliers or patterns
@@ -96,43 +177,26 @@ class PromptTemplates:
             4. Mention any limitations in the analysis
             """
 
-        # Add specific context awareness based on metadata
-        if metadata and metadata.get("recent_updates"):
-            prompt += f"""
-            Note: The database was last updated on {metadata.get('recent_updates')}. 
+_QUERY_TYPE_SUFFIXES: Mapping[str, str] = MappingProxyType({
+    "comparison": _COMPARISON_SUFFIX,
+    "ranking": _RANKING_SUFFIX,
+    "analytics": _ANALYTICS_SUFFIX,
+})
+
+_RECENT_UPDATES_NOTE = """
+            Note: The database was last updated on {recent_updates}. 
             Consider this when providing time-sensitive information.
             """
 
-        return prompt
+# Phần hướng dẫn + chỉ dẫn theo loại câu hỏi được ghép sẵn lúc import cho từng loại
+_RAG_PREFIXES: Mapping[str, str] = MappingProxyType({
+    query_type: _RAG_INSTRUCTIONS + suffix for query_type, suffix in _QUERY_TYPE_SUFFIXES.items()
+})
 
-    @staticmethod
-    def _classify_query_type(query: str) -> str:
-        """
-        Classify the type of query to customize prompt engineering
-        """
-        query = query.lower()
-
-        # Classification logic
-        if any(word in query for word in ["compare", "difference", "versus", "vs", "against"]):
-            return "comparison"
-        elif any(word in query for word in ["top", "best", "highest", "lowest", "rank", "worst"]):
-            return "ranking"
-        elif any(word in query for word in ["average", "mean", "median", "analyze", "trend", "pattern"]):
-            return "analytics"
-        elif any(word in query for word in ["who", "student", "name", "person"]):
-            return "identification"
-        elif any(word in query for word in ["when", "date", "time", "schedule"]):
-            return "temporal"
-        else:
-            return "general"
 
-    @staticmethod
-    def generate_few_shot_examples(query_type: str) -> str:
-        """
-        Generate few-shot examples to guide the model's responses
-        """
-        examples = {
-            "comparison": """
+# Ví dụ few-shot theo loại câu hỏi, mapping chỉ đọc dựng một lần lúc import
+_FEW_SHOT_EXAMPLES: Mapping[str, str] = MappingProxyType({
+    "comparison": """
             Example Q: Compare the performance of students in Math vs Physics this semester.
             Example A: Based on the data provided:
 
@@ -149,7 +213,7 @@ class PromptTemplates:
             The Math class has a slightly higher average score by 3.2 points, and the highest individual score is also 3 points higher than in Physics.
             """,
 
-            "ranking": """
+    "ranking": """
             Example Q: Who are the top 3 students in Computer Science?
             Example A: Based on the data provided, the top 3 students in Computer Science are:
 
@@ -160,7 +224,7 @@ class PromptTemplates:
             This ranking is based on their latest test scores in the Computer Science course.
             """,
 
-            "analytics": """
+    "analytics": """
             Example Q: What's the average performance in Biology this semester?
             Example A: Based on the data provided:
 
@@ -172,9 +236,133 @@ class PromptTemplates:
 
             25% of students scored above 85%, while 15% scored below 70%.
             """,
-        }
+})
+
+
+_STOPWORDS = frozenset({"the", "a", "an", "of", "in", "is", "and", "or", "to", "for", "with", "on", "at", "by"})
+_HIGH_REL = "[HIGH RELEVANCE] "
+
+
+def _is_high_rel(doc: Dict[str, Any], query_type: str) -> bool:
+    # Câu hỏi xếp hạng ưu tiên đoạn có số liệu, các loại khác dựa vào điểm relevance
+    if query_type == "ranking":
+        return _DIGIT_RE.search(doc.get("page_content", "")) is not None
+    relevance: float = doc.get("relevance_score", 0)
+    return relevance > 0.7
+
+
+class PromptSegment(NamedTuple):
+    """Một đoạn prompt; cacheable=True là đoạn giống nhau giữa các request, provider có thể cache"""
+    text: str
+    cacheable: bool
+
+
+_FEW_SHOT_HEADER = "\n\nHere's an example of how to answer this type of question:\n"
 
-        return examples.get(query_type, "")
+
+class RagPrompt(NamedTuple):
+    """Prompt RAG tách thành tiền tố tĩnh (cache được) và phần thân thay đổi theo câu hỏi"""
+    prefix: str
+    body: str
+
+
+@functools.lru_cache(maxsize=16)
+def _rag_prefix(query_type: str, recent_updates: Optional[str]) -> str:
+    # Chỉ phụ thuộc loại câu hỏi và thời điểm cập nhật dữ liệu nên số tiền tố khác nhau rất ít
+    prefix = _RAG_PREFIXES.get(query_type, _RAG_INSTRUCTIONS)
+
+    # Add specific context awareness based on metadata
+    if recent_updates:
+        return prefix + _RECENT_UPDATES_NOTE.format(recent_updates=recent_updates)
+    return prefix
+
+
+# Context lớn hơn ngưỡng này không đưa vào cache prompt để giới hạn bộ nhớ
+_PROMPT_CACHE_MAX_CONTEXT = 32 * 1024
+
+
+@functools.lru_cache(maxsize=256)
+def _format_rag_prompt_cached(query: str, context: str, query_type: str, recent_updates: Optional[str]) -> str:
+    # Key là chính chuỗi context (hash của str được Python nhớ sẵn); dùng hash(context) làm key
+    # thì hai context trùng hash sẽ trả nhầm prompt
+    return _rag_prefix(query_type, recent_updates) + _RAG_QUESTION_TEMPLATE.format(query=query, context=context)
+
+
+class PromptTemplates:
+    """Centralized class for managing all prompt templates with advanced engineering techniques"""
+
+    @staticmethod
+    def get_system_message(user_role: Optional[str] = None) -> str:
+        """Get the appropriate system message based on user role"""
+        return _SYSTEM_MESSAGES.get(user_role, _SYSTEM_MESSAGES[None])
+
+    @staticmethod
+    def build_rag_prompt(query: str, context: str, metadata: Optional[Dict[str, Any]] = None,
+                         query_type: Optional[str] = None) -> RagPrompt:
+        """
+        Create a RAG prompt split into a cacheable prefix and the per-request question/context body
+        """
+        # Extract query type to customize prompt, unless the caller already classified it
+        if query_type is None:
+            query_type = PromptTemplates._classify_query_type(query)
+        recent_updates = metadata.get("recent_updates") if metadata else None
+
+        return RagPrompt(
+            prefix=_rag_prefix(query_type, recent_updates),
+            body=_RAG_QUESTION_TEMPLATE.format(query=query, context=context),
+        )
+
+    @staticmethod
+    def format_rag_prompt(query: str, context: str, metadata: Optional[Dict[str, Any]] = None,
+                          query_type: Optional[str] = None) -> str:
+        """
+        Create a RAG prompt with context inserted intelligently
+        """
+        if query_type is None:
+            query_type = PromptTemplates._classify_query_type(query)
+        recent_updates = metadata.get("recent_updates") if metadata else None
+
+        # Context quá lớn thì dựng thẳng, không giữ trong cache
+        if len(context) > _PROMPT_CACHE_MAX_CONTEXT:
+            return _rag_prefix(query_type, recent_updates) + _RAG_QUESTION_TEMPLATE.format(query=query, context=context)
+        return _format_rag_prompt_cached(query, context, query_type, recent_updates)
+
+    @staticmethod
+    def format_rag_prompt_segmented(query: str, context: str, metadata: Optional[Dict[str, Any]] = None,
+                                    query_type: Optional[str] = None,
+                                    user_role: Optional[str] = None) -> List[PromptSegment]:
+        """
+        Create the full prompt as ordered segments: static text first (cacheable), question and context last
+        """
+        if query_type is None:
+            query_type = PromptTemplates._classify_query_type(query)
+
+        segments = [PromptSegment(PromptTemplates.get_system_message(user_role), True)]
+        few_shot_examples = PromptTemplates.generate_few_shot_examples(query_type)
+        if few_shot_examples:
+            segments.append(PromptSegment(_FEW_SHOT_HEADER + few_shot_examples, True))
+
+        rag_prompt = PromptTemplates.build_rag_prompt(query, context, metadata, query_type)
+        segments.append(PromptSegment(rag_prompt.prefix, True))
+        segments.append(PromptSegment(rag_prompt.body, False))
+        return segments
+
+    @staticmethod
+    def _classify_query_type(query: str) -> str:
+        """
+        Classify the type of query to customize prompt engineering
+        """
+        # Câu hỏi lặp lại được trả thẳng từ cache
+        if len(query) > _CLASSIFY_CACHE_MAX_LEN:
+            return _classify_query_type_impl(query)
+        return _classify_query_type_cached(query)
+
+    @staticmethod
+    def generate_few_shot_examples(query_type: str) -> str:
+        """
+        Generate few-shot examples to guide the model's responses
+        """
+        return _FEW_SHOT_EXAMPLES.get(query_type, "")
 
 
 class RAGPromptOptimizer:
@@ -187,20 +375,30 @@ class RAGPromptOptimizer:
         # This could involve re-ranking based on semantic similarity to the query
 
         # For now, just filter out obviously irrelevant docs
-        filtered_docs = []
-        query_terms = set(query.lower().split())
+        filtered_docs: List[Dict[str, Any]] = []
+        # Bỏ stopword để từ nối không chi phối điểm; câu hỏi không còn từ nào thì giữ nguyên thứ tự retrieval
+        query_terms = frozenset(_WORD_RE.findall(query.lower())) - _STOPWORDS
+        if not query_terms:
+            return retrieved_docs[:3]
 
         for doc in retrieved_docs:
-            content = doc.get("page_content", "").lower()
+            # Tách từ của doc một lần và giữ lại trên chính doc, lần chấm điểm sau chỉ còn giao hai tập
+            tokens: Optional[FrozenSet[str]] = doc.get("_tokens")
+            if tokens is None:
+                tokens = frozenset(_WORD_RE.findall(doc.get("page_content", "").lower()))
+                doc["_tokens"] = tokens
             # Calculate a simple relevance score based on term overlap
-            matching_terms = sum(1 for term in query_terms if term in content)
+            matching_terms = len(query_terms & tokens)
             if matching_terms > 0:
                 doc["relevance_score"] = matching_terms / len(query_terms)
                 filtered_docs.append(doc)
 
-        filtered_docs.sort(key=lambda x: x.get("relevance_score", 0), reverse=True)
+        # Chỉ cần 3 doc điểm cao nhất: chọn bằng heap thay vì sort cả danh sách
+        if len(filtered_docs) <= 3:
+            filtered_docs.sort(key=lambda x: x["relevance_score"], reverse=True)
+            return filtered_docs
 
-        return filtered_docs[:3]
+        return heapq.nlargest(3, filtered_docs, key=lambda x: x["relevance_score"])
 
     @staticmethod
     def prioritize_context(retrieved_docs: List[Dict[str, Any]], query_type: str) -> str:
@@ -211,22 +409,7 @@ class RAGPromptOptimizer:
         if not retrieved_docs:
             return "No relevant information found in the database."
 
-        formatted_chunks = []
-
-        if query_type == "ranking":
-            for doc in retrieved_docs:
-                content = doc.get("page_content", "")
-                if any(c.isdigit() for c in content):
-                    formatted_chunks.append(f"[HIGH RELEVANCE] {content}")
-                else:
-                    formatted_chunks.append(content)
-        else:
-            for i, doc in enumerate(retrieved_docs):
-                content = doc.get("page_content", "")
-                relevance = doc.get("relevance_score", 0)
-                if relevance > 0.7:
-                    formatted_chunks.append(f"[HIGH RELEVANCE] {content}")
-                else:
-                    formatted_chunks.append(content)
-
-        return "\n\n".join(formatted_chunks)
\ No newline at end of file
+        return "\n\n".join(
+            _HIGH_REL + doc.get("page_content", "") if _is_high_rel(doc, query_type) else doc.get("page_content", "")
+            for doc in retrieved_docs
+        )
\ No newline at end of file
@@ -1,15 +1,30 @@
+from dataclasses import dataclass
 from typing import Any, Optional
 
-def success_response(data: Any = None, message: Optional[str] = None):
-    return {
-        "success": True,
-        "message": message or "success",
-        "data": data,
-    }
-
-def error_response(error: str, details: Any = None):
-    return {
-        "success": False,
-        "error": error,
-        "details": details,
-    }
+
+@dataclass(frozen=True, slots=True)
+class SuccessResponse:
+    success: bool = True
+    message: str = "success"
+    data: Any = None
+
+
+@dataclass(frozen=True, slots=True, kw_only=True)
+class ErrorResponse:
+    success: bool = False
+    error: str
+    details: Any = None
+
+
+# Trường hợp phổ biến nhất không có payload: dùng chung một instance bất biến
+_EMPTY_SUCCESS = SuccessResponse()
+
+
+def success_response(data: Any = None, message: Optional[str] = None) -> SuccessResponse:
+    if data is None and not message:
+        return _EMPTY_SUCCESS
+    return SuccessResponse(message=message or "success", data=data)
+
+
+def error_response(error: str, details: Any = None) -> ErrorResponse:
+    return ErrorResponse(error=error, details=details)